@@ -0,0 +1,19 @@
+import pytest
+from django.core.cache import cache
+
+from nature.auth_events import auth_failure_reporter
+from nature.registry import feature_class_registry, hmac_group_registry
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Do not let cached responses, tiles, feature classes, HMAC groups and failures leak from one test to another"""
+    cache.clear()
+    feature_class_registry.clear()
+    hmac_group_registry.clear()
+    auth_failure_reporter.clear()
+    yield
+    cache.clear()
+    feature_class_registry.clear()
+    hmac_group_registry.clear()
+    auth_failure_reporter.clear()
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.13 on 2026-10-18 07:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hmac_auth", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="hmacgroup",
+            name="name",
+            field=models.CharField(
+                db_index=True, max_length=200, verbose_name="group name"
+            ),
+        ),
+    ]
@@ -12,7 +12,7 @@ class HMACGroup(models.Model):
         (OFFICE, _("Office")),
     ]
 
-    name = models.CharField(_("group name"), max_length=200)
+    name = models.CharField(_("group name"), max_length=200, db_index=True)
     permission_level = models.CharField(
         choices=PERMISSION_LEVEL_CHOICES, default=OFFICE, max_length=50
     )
@@ -61,8 +61,10 @@ env = environ.Env(
     ALLOWED_HOSTS=(list, []),
     ADMINS=(list, []),
     DATABASE_URL=(str, "postgis:///ltj"),
+    CACHE_URL=(str, "locmemcache://"),
     MEDIA_ROOT=(environ.Path(), root("media")),
     STATIC_ROOT=(environ.Path(), root("static")),
+    REPORT_PUBLISH_ROOT=(environ.Path(), root("reports")),
     MEDIA_URL=(str, "/media/"),
     STATIC_URL=(str, "/static/"),
     LOG_LEVEL=(str, "INFO"),
@@ -70,6 +72,17 @@ env = environ.Env(
     SENTRY_ENVIRONMENT=(str, "unconfigured"),
     WFS_SERVER_URL=(str, "https://kartta.hel.fi/ws/geoserver/avoindata/wfs"),
     WFS_NAMESPACE=(str, "avoindata"),
+    API_MAX_GEOMETRY_VERTICES=(int, 10000),
+    LOCAL_CACHE_VERSION_TIMEOUT=(int, 60),
+    TILE_CACHE_TIMEOUT=(int, 86400),
+    API_CACHE_TIMEOUT=(int, 600),
+    REPORT_CACHE_TIMEOUT=(int, 600),
+    REPORT_PDF_COMMAND=(str, ""),
+    REPORT_PDF_WORKERS=(int, 2),
+    REPORT_PDF_CACHE_TIMEOUT=(int, 86400),
+    HMAC_FAILURE_BUFFER_SIZE=(int, 1000),
+    HMAC_FAILURE_FLUSH_INTERVAL=(int, 10),
+    HMAC_FAILURE_EVENTS_PER_FLUSH=(int, 10),
     OIDC_AUDIENCE=(str, ""),
     OIDC_API_SCOPE_PREFIX=(str, ""),
     OIDC_REQUIRE_API_SCOPE_FOR_AUTHENTICATION=(bool, False),
@@ -96,6 +109,9 @@ MEDIA_URL = env("MEDIA_URL")
 STATIC_ROOT = env("STATIC_ROOT")
 MEDIA_ROOT = env("MEDIA_ROOT")
 
+# Directory where the publish_reports command writes the static www reports
+REPORT_PUBLISH_ROOT = env("REPORT_PUBLISH_ROOT")
+
 # This governs the number of fields allowed in form submissions, including
 # the admin site. LTJ has admin pages that upload well over 2000 fields.
 # This settings might be the one to tweak if submitting an admin page causes
@@ -153,6 +169,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "nature.middleware.HMACAuthMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "django.middleware.locale.LocaleMiddleware",
@@ -182,13 +199,20 @@ WSGI_APPLICATION = "ltj.wsgi.application"
 REST_FRAMEWORK = {
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 10,
-    "DEFAULT_AUTHENTICATION_CLASSES": ("helusers.oidc.ApiTokenAuthentication",),
+    "DEFAULT_AUTHENTICATION_CLASSES": (
+        "nature.authentication.HMACAuthentication",
+        "helusers.oidc.ApiTokenAuthentication",
+    ),
 }
 
 DATABASES = {
     "default": env.db(),
 }
 
+CACHES = {
+    "default": env.cache(),
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -250,6 +274,42 @@ SRID = 3879  # Spatial reference system identifier used for geometry fields
 WFS_SERVER_URL = env("WFS_SERVER_URL")  # WFS server url for features
 WFS_NAMESPACE = env("WFS_NAMESPACE")  # Namespace for WFS layers
 
+# Feature geometries with more vertices are simplified in API responses
+API_MAX_GEOMETRY_VERTICES = env("API_MAX_GEOMETRY_VERTICES")
+
+# Seconds the versions of cached data sets are kept in a local memory cache,
+# which is not invalidated by the changes in the other processes
+LOCAL_CACHE_VERSION_TIMEOUT = env("LOCAL_CACHE_VERSION_TIMEOUT")
+
+# Seconds to cache vector tiles, tiles are also invalidated when features change
+TILE_CACHE_TIMEOUT = env("TILE_CACHE_TIMEOUT")
+
+# Seconds to cache API responses, responses are also invalidated when data changes
+API_CACHE_TIMEOUT = env("API_CACHE_TIMEOUT")
+
+# Seconds to cache rendered reports, reports are also invalidated when data changes
+REPORT_CACHE_TIMEOUT = env("REPORT_CACHE_TIMEOUT")
+
+# Command converting HTML reports from stdin to PDF documents in stdout,
+# PDF documents of the reports are not available if empty
+REPORT_PDF_COMMAND = env("REPORT_PDF_COMMAND")
+
+# Number of background threads running REPORT_PDF_COMMAND in each process
+REPORT_PDF_WORKERS = env("REPORT_PDF_WORKERS")
+
+# Seconds to cache PDF documents, they are also invalidated when data changes
+REPORT_PDF_CACHE_TIMEOUT = env("REPORT_PDF_CACHE_TIMEOUT")
+
+# Number of distinct hmac authorization failures buffered in each process
+# before further failures are dropped
+HMAC_FAILURE_BUFFER_SIZE = env("HMAC_FAILURE_BUFFER_SIZE")
+
+# Seconds between sending the buffered failures to Sentry
+HMAC_FAILURE_FLUSH_INTERVAL = env("HMAC_FAILURE_FLUSH_INTERVAL")
+
+# Maximum number of failures sent to Sentry per flush in each process
+HMAC_FAILURE_EVENTS_PER_FLUSH = env("HMAC_FAILURE_EVENTS_PER_FLUSH")
+
 DEFAULT_AUTO_FIELD='django.db.models.AutoField'
 
 TINYMCE_JS_URL = os.path.join(STATIC_URL, "tinymce/tinymce.min.js")
@@ -3,11 +3,17 @@ from django.contrib import admin
 from django.utils.translation import gettext_lazy as _
 
 from nature.api import router
+from nature.tiles import FeatureTileView
 
 urlpatterns = [
     path("auth/", include("social_django.urls", namespace="social")),
     path("helauth/", include("helusers.urls")),
     path("admin/", admin.site.urls),
+    path(
+        "v1/tiles/<int:z>/<int:x>/<int:y>.mvt",
+        FeatureTileView.as_view(),
+        name="feature-tile",
+    ),
     path("v1/", include(router.urls)),
     path("ltj/", include("nature.urls")),
 ]
@@ -1,5 +1,6 @@
 from collections import OrderedDict
 from django.contrib.gis import admin
+from django.db.models import OuterRef, Subquery
 from django.utils.translation import gettext_lazy as _
 from django.utils.html import format_html
 from django.urls import reverse
@@ -8,11 +9,13 @@ from .models import (
     Feature,
     FeatureClass,
     FeatureLink,
+    FeatureObservationCount,
     FeaturePublication,
     Observation,
     ObservationSeries,
     Publication,
     Species,
+    SpeciesObservationCount,
     LinkType,
     HabitatType,
     Regulation,
@@ -61,16 +64,38 @@ class TransactionRegulationInline(admin.TabularInline):
     model = TransactionRegulation
 
 
+class ObservationCountAdminMixin:
+    """Show the stored number of observations in the changelist"""
+
+    observation_count_model = None
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        counts = self.observation_count_model.objects.filter(
+            **{self.observation_count_model.counted_field: OuterRef("pk")},
+            role="ADMIN",
+        ).values("count")
+        return qs.annotate(observation_count=Subquery(counts[:1]))
+
+    def observation_count(self, obj):
+        return obj.observation_count
+
+    observation_count.short_description = _("observations")
+    observation_count.admin_order_field = "observation_count"
+
+
 @admin.register(Species)
-class SpeciesAdmin(admin.ModelAdmin):
+class SpeciesAdmin(ObservationCountAdminMixin, admin.ModelAdmin):
     list_display = (
         "id",
         "name_fi",
         "name_sci_1",
         "name_subspecies_1",
         "code",
+        "observation_count",
         "report",
     )
+    observation_count_model = SpeciesObservationCount
     search_fields = ("name_fi", "name_sci_1", "name_subspecies_1", "code", "id")
     list_filter = ("taxon", "taxon_1")
     actions = None
@@ -205,7 +230,7 @@ class SquareInline(admin.StackedInline):
 
 
 @admin.register(Feature)
-class FeatureAdmin(admin.GISModelAdmin):
+class FeatureAdmin(ObservationCountAdminMixin, admin.GISModelAdmin):
     form = FeatureForm
     readonly_fields = (
         "_area",
@@ -214,7 +239,16 @@ class FeatureAdmin(admin.GISModelAdmin):
         "last_modified_by",
         "last_modified_time",
     )
-    list_display = ("id", "feature_class", "fid", "name", "report", "active")
+    list_display = (
+        "id",
+        "feature_class",
+        "fid",
+        "name",
+        "observation_count",
+        "report",
+        "active",
+    )
+    observation_count_model = FeatureObservationCount
     search_fields = ("feature_class__name", "name", "fid", "id")
     list_filter = ("feature_class", "active")
     form = FeatureForm
@@ -1,6 +1,9 @@
-from django.contrib.gis.db.models.functions import Transform
+from django.conf import settings
+from django.db import models
+from django.utils.cache import patch_vary_headers
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ValidationError
 from rest_framework.fields import SerializerMethodField
-from rest_framework.reverse import reverse
 from rest_framework import serializers, viewsets, routers, relations
 from rest_framework_gis.fields import GeometryField
 
@@ -39,6 +42,23 @@ from nature.models import (
     TransactionRegulation,
     TransactionFeature,
 )
+from nature.authentication import get_request_role
+from nature.conditional import ConditionalGetMixin
+from nature.export import GeoJSONExportMixin
+from nature.filters import SpatialFilter
+from nature.functions import simplified_wgs84_geometry
+from nature.hyperlinks import CachedReverseMixin
+from nature.pagination import IdCursorPagination
+from nature.prefetching import build_query_plan, filter_visible
+from nature.response_cache import ResponseCacheMixin
+
+
+def _is_prefetched(iterable):
+    return getattr(iterable, "_prefetch_done", False)
+
+
+def _get_context_role(field):
+    return get_request_role(field.context.get("request"))
 
 
 class ProtectedManyRelatedField(relations.ManyRelatedField):
@@ -47,13 +67,17 @@ class ProtectedManyRelatedField(relations.ManyRelatedField):
     """
 
     def to_representation(self, iterable):
-        if hasattr(iterable, "open_data"):
-            iterable = iterable.open_data()
+        # Prefetched relations are filtered when the queryset is planned,
+        # filtering them again would throw away the prefetched objects
+        if not _is_prefetched(iterable):
+            iterable = filter_visible(iterable, _get_context_role(self))
 
         return super().to_representation(iterable)
 
 
-class ProtectedHyperlinkedRelatedField(relations.HyperlinkedRelatedField):
+class ProtectedHyperlinkedRelatedField(
+    CachedReverseMixin, relations.HyperlinkedRelatedField
+):
     """
     Handles view permissions for related field listings with protection_level and open_data
     """
@@ -68,11 +92,7 @@ class ProtectedHyperlinkedRelatedField(relations.HyperlinkedRelatedField):
         return ProtectedManyRelatedField(**list_kwargs)
 
     def get_queryset(self):
-        qs = super().get_queryset()
-        if hasattr(qs, "open_data"):
-            qs = qs.open_data()
-
-        return qs
+        return filter_visible(super().get_queryset(), _get_context_role(self))
 
 
 class SpanOneToOneProtectedHyperlinkedRelatedField(ProtectedHyperlinkedRelatedField):
@@ -83,28 +103,202 @@ class SpanOneToOneProtectedHyperlinkedRelatedField(ProtectedHyperlinkedRelatedFi
 
     def get_url(self, obj, view_name, request, format):
         kwargs = {"pk": obj.pk}
-        return reverse(view_name, kwargs=kwargs, request=request, format=format)
+        return self.reverse(view_name, kwargs=kwargs, request=request, format=format)
+
+
+class HyperlinkedIdentityField(CachedReverseMixin, relations.HyperlinkedIdentityField):
+    """
+    The url field of the serializers, see nature.hyperlinks.cached_reverse
+    """
+
+
+class FeatureGeometryField(GeometryField):
+    """
+    WGS84 geometry of a feature. Uses the simplified geometry when the queryset
+    is annotated with one, and the coordinate precision given in the context.
+    """
+
+    def bind(self, field_name, parent):
+        super().bind(field_name, parent)
+        self.precision = self.context.get("geometry_precision", self.precision)
+
+    def get_attribute(self, instance):
+        simplified_geometry = getattr(instance, "simplified_geometry", None)
+        if simplified_geometry is not None:
+            return simplified_geometry
+        return super().get_attribute(instance)
+
+
+class ProtectedListSerializer(serializers.ListSerializer):
+    """
+    Serializes a list of objects fetching the visible related objects of the
+    whole list at once.
+
+    Relations of the child serializer that are not fetched yet are prefetched
+    for all the objects with querysets filtered to the objects visible to the
+    role of the request, so that the related fields do not filter the related
+    managers of each object separately.
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        instances = list(iterable)
+        role = _get_context_role(self)
+        build_query_plan(self.child, role).prefetch_objects(instances)
+        return super().to_representation(instances)
 
 
 class ProtectedHyperlinkedModelSerializer(serializers.HyperlinkedModelSerializer):
     """
     Handles view permissions for related field listings with ProtectedNatureModel instances.
+
+    The fields of the top level serializer can be limited with the ?fields=
+    and ?omit= query parameters, which take comma separated field names.
+    Fields left out are not serialized and their relations are not fetched.
     """
 
     serializer_related_field = ProtectedHyperlinkedRelatedField
+    serializer_url_field = HyperlinkedIdentityField
 
-
-class ProtectedViewSet(viewsets.ReadOnlyModelViewSet):
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        # Same as BaseSerializer.many_init, but lists default to ProtectedListSerializer
+        list_kwargs = {}
+        for key in serializers.LIST_SERIALIZER_KWARGS_REMOVE:
+            value = kwargs.pop(key, None)
+            if value is not None:
+                list_kwargs[key] = value
+        list_kwargs["child"] = cls(*args, **kwargs)
+        list_kwargs.update(
+            {
+                key: value
+                for key, value in kwargs.items()
+                if key in serializers.LIST_SERIALIZER_KWARGS
+            }
+        )
+        meta = getattr(cls, "Meta", None)
+        list_serializer_class = getattr(
+            meta, "list_serializer_class", ProtectedListSerializer
+        )
+        return list_serializer_class(*args, **list_kwargs)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get("request")
+        if request is not None and self._is_top_level():
+            fields = self._get_sparse_fields(fields, request.query_params)
+        return fields
+
+    def _is_top_level(self):
+        root = self.root
+        if isinstance(root, serializers.ListSerializer):
+            root = root.child
+        return root is self
+
+    def _get_sparse_fields(self, fields, query_params):
+        included = _parse_field_names(query_params, "fields")
+        omitted = _parse_field_names(query_params, "omit")
+        for param, names in (("fields", included), ("omit", omitted)):
+            unknown = names - set(fields) if names else set()
+            if unknown:
+                raise ValidationError(
+                    {param: _("Unknown fields: {0}").format(", ".join(sorted(unknown)))}
+                )
+
+        return {
+            name: field
+            for name, field in fields.items()
+            if (not included or name in included) and name not in omitted
+        }
+
+
+def _parse_field_names(query_params, param):
+    value = query_params.get(param, "")
+    return {name.strip() for name in value.split(",") if name.strip()}
+
+
+# Code lists rarely change, cache them longer than other data
+CODE_LIST_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+class ProtectedViewSet(
+    ConditionalGetMixin, ResponseCacheMixin, viewsets.ReadOnlyModelViewSet
+):
     """
     Handles view permissions for ProtectedNatureModel instances.
+
+    The queryset is joined and prefetched according to the fields of the
+    serializer, see nature.prefetching.build_query_plan. List and detail
+    responses support conditional requests and are cached, see
+    nature.conditional.ConditionalGetMixin and
+    nature.response_cache.ResponseCacheMixin.
+
+    Requests authenticated with nature.authentication.HMACAuthentication see
+    the objects visible to their role, other requests see open data.
     """
 
-    def get_queryset(self):
-        qs = super().get_queryset()
-        if hasattr(qs, "open_data"):
-            qs = qs.open_data()
+    # Models that determine which objects are visible as open data
+    visibility_models = (Feature, FeatureClass, Species)
 
-        return qs
+    # Serializer fields mapped to the model fields they read. The model fields
+    # are deferred when the serializer field is left out with ?fields= or ?omit=
+    deferrable_fields = {}
+
+    # Pagination class used instead of the default one when the client
+    # opts in with ?pagination=cursor. Viewsets without one ignore the
+    # parameter.
+    cursor_pagination_class = None
+    pagination_mode_query_param = "pagination"
+
+    # Request headers the visible objects depend on
+    role_headers = ("Authorization", "Proxy-Authorization", "X-Forwarded-Groups")
+
+    def get_queryset(self):
+        role = self.get_role()
+        qs = filter_visible(super().get_queryset(), role)
+
+        serializer = self.get_serializer()
+        deferred = [
+            model_field
+            for field_name, model_fields in self.deferrable_fields.items()
+            if field_name not in serializer.fields
+            for model_field in model_fields
+        ]
+        if deferred:
+            qs = qs.defer(*deferred)
+
+        return build_query_plan(serializer, role).apply(qs)
+
+    def get_role(self):
+        """Return the UserRole of the request or None for open data"""
+        return get_request_role(self.request)
+
+    def get_role_key(self):
+        role = self.get_role()
+        return role.name if role is not None else super().get_role_key()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        patch_vary_headers(response, self.role_headers)
+        return response
+
+    def get_dependency_models(self):
+        models = super().get_dependency_models()
+        if any(hasattr(model._default_manager.none(), "open_data") for model in models):
+            models |= set(self.visibility_models)
+        return models
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator") and self._cursor_pagination_requested():
+            self._paginator = self.cursor_pagination_class()
+        return super().paginator
+
+    def _cursor_pagination_requested(self):
+        if self.cursor_pagination_class is None:
+            return False
+        mode = self.request.query_params.get(self.pagination_mode_query_param)
+        return mode == "cursor"
 
 
 class ConservationProgrammeSerializer(ProtectedHyperlinkedModelSerializer):
@@ -208,7 +402,7 @@ class FeatureSerializer(ProtectedHyperlinkedModelSerializer):
     square = SquareSerializer()
     protection = ProtectionSerializer()
     text = SerializerMethodField()
-    geometry = GeometryField(source="geom")  # using transformed geometry
+    geometry = FeatureGeometryField(source="geometry_wgs84")
     links = FeatureLinkSerializer(many=True)
 
     def get_text(self, obj):
@@ -531,11 +725,84 @@ class SpeciesRegulationSerializer(ProtectedHyperlinkedModelSerializer):
         fields = ("id", "url", "species", "regulation")
 
 
-class FeatureViewSet(ProtectedViewSet):
-    queryset = Feature.objects.all().annotate(
-        geom=Transform("geometry", 4326)
-    )  # display coordinates in WGS84
+class FeatureViewSet(GeoJSONExportMixin, ProtectedViewSet):
+    queryset = Feature.objects.all()
     serializer_class = FeatureSerializer
+    filter_backends = [SpatialFilter]
+    cursor_pagination_class = IdCursorPagination
+    deferrable_fields = {
+        "geometry": ("geometry", "geometry_wgs84"),
+        "text": ("text", "text_www"),
+    }
+    max_geometry_precision = 15
+    export_geometry_field = "geometry_wgs84"
+    export_fields = (
+        "id",
+        "fid",
+        "name",
+        "feature_class",
+        "description",
+        "notes",
+        "active",
+        "created_time",
+        "last_modified_time",
+        "number",
+        "area",
+        "text",
+        "text_www",
+        "protection_level",
+    )
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if "geometry" not in self.get_serializer().fields:
+            return qs
+
+        simplified_geometry = simplified_wgs84_geometry(
+            tolerance=self._get_simplify_tolerance(),
+            max_vertices=settings.API_MAX_GEOMETRY_VERTICES,
+        )
+        if simplified_geometry is not None:
+            qs = qs.annotate(simplified_geometry=simplified_geometry)
+        return qs
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["geometry_precision"] = self._get_geometry_precision()
+        return context
+
+    def get_export_properties(self, values):
+        # Text should not be public if text_www exists
+        text_www = values.pop("text_www")
+        if text_www:
+            values["text"] = text_www
+        return values
+
+    def _get_simplify_tolerance(self):
+        """Simplification tolerance in meters from ?simplify=<tolerance>"""
+        value = self.request.query_params.get("simplify")
+        if value is None:
+            return None
+        try:
+            tolerance = float(value)
+        except ValueError:
+            tolerance = -1
+        if not tolerance >= 0:
+            raise ValidationError({"simplify": _("Invalid simplification tolerance")})
+        return tolerance
+
+    def _get_geometry_precision(self):
+        """Number of decimals in coordinates from ?precision=<digits>"""
+        value = self.request.query_params.get("precision")
+        if value is None:
+            return None
+        try:
+            precision = int(value)
+        except ValueError:
+            precision = -1
+        if not 0 <= precision <= self.max_geometry_precision:
+            raise ValidationError({"precision": _("Invalid coordinate precision")})
+        return precision
 
 
 class FeatureClassViewSet(ProtectedViewSet):
@@ -571,6 +838,7 @@ class PublicationViewSet(ProtectedViewSet):
 class PublicationTypeViewSet(ProtectedViewSet):
     queryset = PublicationType.objects.all()
     serializer_class = PublicationTypeSerializer
+    cache_timeout = CODE_LIST_CACHE_TIMEOUT
 
 
 class ProtectionViewSet(ProtectedViewSet):
@@ -596,11 +864,33 @@ class SpeciesViewSet(ProtectedViewSet):
 class OccurrenceViewSet(ProtectedViewSet):
     queryset = Occurrence.objects.all()
     serializer_class = OccurrenceSerializer
+    cache_timeout = CODE_LIST_CACHE_TIMEOUT
 
 
-class ObservationViewSet(ProtectedViewSet):
+class ObservationViewSet(GeoJSONExportMixin, ProtectedViewSet):
     queryset = Observation.objects.all()
     serializer_class = ObservationSerializer
+    cursor_pagination_class = IdCursorPagination
+    export_geometry_field = "feature__geometry_wgs84"
+    export_fields = (
+        "id",
+        "feature",
+        "species",
+        "series",
+        "abundance",
+        "frequency",
+        "migration_class",
+        "origin",
+        "breeding_degree",
+        "description",
+        "notes",
+        "date",
+        "occurrence",
+        "created_time",
+        "last_modified_time",
+        "protection_level",
+        "code",
+    )
 
 
 class ObservationSeriesViewSet(ProtectedViewSet):
@@ -631,6 +921,7 @@ class TransactionViewSet(ProtectedViewSet):
 class TransactionTypeViewSet(ProtectedViewSet):
     queryset = TransactionType.objects.all()
     serializer_class = TransactionTypeSerializer
+    cache_timeout = CODE_LIST_CACHE_TIMEOUT
 
 
 class TransactionFeatureViewSet(ProtectedViewSet):
@@ -641,31 +932,37 @@ class TransactionFeatureViewSet(ProtectedViewSet):
 class AbundanceViewSet(ProtectedViewSet):
     queryset = Abundance.objects.all()
     serializer_class = AbundanceSerializer
+    cache_timeout = CODE_LIST_CACHE_TIMEOUT
 
 
 class FrequencyViewSet(ProtectedViewSet):
     queryset = Frequency.objects.all()
     serializer_class = FrequencySerializer
+    cache_timeout = CODE_LIST_CACHE_TIMEOUT
 
 
 class LinkTypeViewSet(ProtectedViewSet):
     queryset = LinkType.objects.all()
     serializer_class = LinkTypeSerializer
+    cache_timeout = CODE_LIST_CACHE_TIMEOUT
 
 
 class MigrationClassViewSet(ProtectedViewSet):
     queryset = MigrationClass.objects.all()
     serializer_class = MigrationClassSerializer
+    cache_timeout = CODE_LIST_CACHE_TIMEOUT
 
 
 class OriginViewSet(ProtectedViewSet):
     queryset = Origin.objects.all()
     serializer_class = OriginSerializer
+    cache_timeout = CODE_LIST_CACHE_TIMEOUT
 
 
 class BreedingDegreeViewSet(ProtectedViewSet):
     queryset = BreedingDegree.objects.all()
     serializer_class = BreedingDegreeSerializer
+    cache_timeout = CODE_LIST_CACHE_TIMEOUT
 
 
 class ProtectionCriterionViewSet(ProtectedViewSet):
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class NatureConfig(AppConfig):
     name = "nature"
     verbose_name = "ltj"
+
+    def ready(self):
+        from nature import checks, signals  # noqa: F401
@@ -0,0 +1,112 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from sentry_sdk import capture_event
+
+logger = logging.getLogger(__name__)
+
+
+class AuthFailureReporter:
+    """Buffer reporting failed hmac authorizations to Sentry in the background
+
+    Events of the same type, client IP address and path are merged into one
+    event with the number of failures and the time of the first and the
+    last failure. At most HMAC_FAILURE_BUFFER_SIZE distinct events are kept,
+    later ones are dropped until the buffer is flushed. A background thread
+    flushes the buffer every HMAC_FAILURE_FLUSH_INTERVAL seconds and sends at
+    most HMAC_FAILURE_EVENTS_PER_FLUSH events each time, the rest wait for
+    the next flush. The thread is started on first use, i.e. after the
+    server has forked its workers.
+
+    The counters in stats() are kept per process since it was started.
+    """
+
+    COUNTERS = ("reported", "merged", "dropped", "sent", "failed")
+
+    def __init__(self):
+        self._thread = None
+        self._lock = threading.Lock()
+        self.clear()
+
+    def report(self, event):
+        """Add a failure to the buffer
+
+        :param event: The Sentry event with type, ip-address and path, the
+            path without the query string so that varying the query string
+            does not fill the buffer
+        :type event: dict
+        """
+        key = (event["type"], event["ip-address"], event["path"])
+        now = time.time()
+        with self._lock:
+            self._counters["reported"] += 1
+            if key in self._events:
+                buffered = self._events[key]
+                buffered["count"] += 1
+                buffered["last-seen"] = now
+                self._counters["merged"] += 1
+            elif len(self._events) < settings.HMAC_FAILURE_BUFFER_SIZE:
+                self._events[key] = {
+                    **event,
+                    "count": 1,
+                    "first-seen": now,
+                    "last-seen": now,
+                }
+            else:
+                self._counters["dropped"] += 1
+                return
+            self._start()
+
+    def flush(self):
+        """Send the oldest buffered events to Sentry
+
+        :return: The number of events sent
+        :rtype: int
+        """
+        with self._lock:
+            keys = list(self._events)[: settings.HMAC_FAILURE_EVENTS_PER_FLUSH]
+            events = [self._events.pop(key) for key in keys]
+
+        sent = 0
+        for event in events:
+            try:
+                capture_event(event)
+            except Exception:
+                logger.exception("Could not report hmac authorization failure")
+            else:
+                sent += 1
+
+        with self._lock:
+            self._counters["sent"] += sent
+            self._counters["failed"] += len(events) - sent
+        return sent
+
+    def stats(self):
+        """Return the counters and the number of buffered events"""
+        with self._lock:
+            return dict(self._counters, buffered=len(self._events))
+
+    def clear(self):
+        with self._lock:
+            self._events = {}
+            self._counters = dict.fromkeys(self.COUNTERS, 0)
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="auth-failure-reporter", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(settings.HMAC_FAILURE_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Could not flush hmac authorization failures")
+
+
+auth_failure_reporter = AuthFailureReporter()
@@ -0,0 +1,41 @@
+from django.contrib.auth.models import AnonymousUser
+from django.utils.translation import gettext_lazy as _
+from rest_framework import authentication, exceptions
+
+from .enums import UserRole
+from .hmac import HMACAuth
+from .middleware import get_user_role
+
+
+class HMACAuthentication(authentication.BaseAuthentication):
+    """Authenticate API requests signed by the API gateway with hmac
+
+    Requests with a valid hmac authorization header are authenticated as
+    anonymous users with their UserRole as request.auth, see
+    get_request_role. The role is resolved once per request, usually by
+    nature.middleware.HMACAuthMiddleware. Requests without a hmac header
+    are left to the other authentication classes.
+    """
+
+    def authenticate(self, request):
+        hmac_auth = HMACAuth(request._request)
+        if not hmac_auth.is_hmac_request:
+            return None
+
+        role = getattr(request._request, "user_role", None)
+        if role is None:
+            role = get_user_role(request._request)
+        if role is None:
+            raise exceptions.AuthenticationFailed(_("Invalid hmac signature."))
+        return AnonymousUser(), role
+
+    def authenticate_header(self, request):
+        return "hmac"
+
+
+def get_request_role(request):
+    """Return the UserRole of an API request or None for open data"""
+    if request is None:
+        return None
+    auth = getattr(request, "auth", None)
+    return auth if isinstance(auth, UserRole) else None
@@ -0,0 +1,88 @@
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+VERSION_KEY_PREFIX = "nature:version:"
+
+
+def get_version(name):
+    """Return the current version of a cached data set
+
+    Cache keys that include the version are invalidated by bump_version
+    without having to know or delete the keys themselves. The version is
+    the time of the latest change in milliseconds.
+
+    :param name: Name of the data set, e.g. a model label from get_model_version_name
+    :return: The version number
+    :rtype: int
+    """
+    return get_versions([name])[0]
+
+
+def get_versions(names):
+    """Return the current versions of the given data sets in the same order"""
+    keys = [VERSION_KEY_PREFIX + name for name in names]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Nothing is known about the data set since the version was
+            # evicted or never set, so it must be treated as a change
+            cache.add(key, _now(), timeout=_get_version_timeout())
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_version(*names):
+    """Invalidate the cached data sets with the given names"""
+    keys = [VERSION_KEY_PREFIX + name for name in names]
+    versions = cache.get_many(keys)
+    now = _now()
+    # A concurrent bump may be overwritten, but the version is changed either way
+    cache.set_many(
+        {key: max(versions.get(key, 0) + 1, now) for key in keys},
+        timeout=_get_version_timeout(),
+    )
+
+
+def get_model_version_name(model):
+    """Return the name of the data set of a model"""
+    return model._meta.label_lower
+
+
+def get_model_versions(models):
+    return get_versions([get_model_version_name(model) for model in models])
+
+
+def bump_model_version(*models):
+    names = [get_model_version_name(model) for model in models]
+    bump_version(*names)
+    # Other processes may read the data before the transaction is committed
+    # and cache it under the new version, so it is bumped again on commit
+    transaction.on_commit(partial(bump_version, *names))
+
+
+def is_process_local_cache():
+    """Return True if the default cache is not shared by the processes"""
+    return isinstance(caches["default"], LocMemCache)
+
+
+def _get_version_timeout():
+    """Return the number of seconds the versions are kept
+
+    The versions in a cache that is not shared by the processes are never
+    bumped by the changes in the other processes. They expire after
+    LOCAL_CACHE_VERSION_TIMEOUT seconds instead, which invalidates the
+    cached data sets and reloads the registries of each process at least
+    that often.
+    """
+    if is_process_local_cache():
+        return settings.LOCAL_CACHE_VERSION_TIMEOUT
+    return None
+
+
+def _now():
+    return int(time.time() * 1000)
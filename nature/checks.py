@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+from nature.caching import is_process_local_cache
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Warn if the cache is not shared by the processes of a deployment"""
+    if settings.DEBUG or not is_process_local_cache():
+        return []
+    return [
+        Warning(
+            "The default cache is a local memory cache, which is not shared "
+            "by the processes.",
+            hint=(
+                "Changes, e.g. revoked HMAC groups, reach the other processes "
+                "only after LOCAL_CACHE_VERSION_TIMEOUT seconds. Set CACHE_URL "
+                "to a shared cache such as memcached."
+            ),
+            id="nature.W001",
+        )
+    ]
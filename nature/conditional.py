@@ -0,0 +1,141 @@
+import hashlib
+import math
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.pagination import CursorPagination
+
+from nature.caching import get_model_version_name, get_model_versions
+from nature.prefetching import get_serialized_models
+
+
+class ConditionalGetMixin:
+    """Viewset mixin adding ETag and Last-Modified to list and detail responses
+
+    The validators are computed from the versions of the models the response
+    depends on, which change whenever objects of those models are saved or
+    deleted, and from the number of objects and their latest
+    last_modified_time. List responses only aggregate the objects of the
+    requested page, and cursor pages rely on the versions alone, so that the
+    validators do not scan the whole table. Requests with matching
+    If-None-Match or If-Modified-Since headers get a 304 response without
+    serializing any objects.
+    """
+
+    last_modified_field = "last_modified_time"
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        queryset = self.get_page_queryset(queryset)
+        return self._get_conditional_response(
+            queryset, super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            **{self.lookup_field: kwargs[lookup_url_kwarg]}
+        )
+        return self._get_conditional_response(
+            queryset, super().retrieve, request, *args, **kwargs
+        )
+
+    def get_dependency_models(self):
+        """Return the models whose changes may change the response"""
+        return get_serialized_models(self.get_serializer())
+
+    def get_dependency_versions(self):
+        """Return the current versions of the dependency models in a stable order"""
+        if not hasattr(self, "_dependency_versions"):
+            models = sorted(self.get_dependency_models(), key=get_model_version_name)
+            self._dependency_versions = get_model_versions(models)
+        return self._dependency_versions
+
+    def get_page_queryset(self, queryset):
+        """Return the objects of the requested list page for the validators
+
+        :param queryset: The filtered queryset of the list
+        :return: The page slice of the queryset, the whole queryset if the
+            page cannot be determined, or None for cursor pages, whose
+            validators are computed from the versions alone
+        """
+        paginator = self.paginator
+        if paginator is None:
+            return queryset
+        if isinstance(paginator, CursorPagination):
+            return None
+
+        page_size = paginator.get_page_size(self.request)
+        page_query_param = getattr(paginator, "page_query_param", None)
+        if not page_size or page_query_param is None:
+            return queryset
+        try:
+            page = int(self.request.query_params.get(page_query_param, 1))
+        except ValueError:
+            return queryset  # e.g. ?page=last
+        if page < 1:
+            return queryset
+
+        start = (page - 1) * page_size
+        end = start + page_size
+        return queryset[start:end]
+
+    def get_role_key(self):
+        """Return the key of the data set visible to the requesting user"""
+        return "open_data"
+
+    def get_validators(self, queryset):
+        """Return the ETag and the Last-Modified timestamp of the response
+
+        :param queryset: The filtered queryset of the response, or None to
+            use the model versions only
+        :return: The quoted ETag and the timestamp, which may be None
+        :rtype: tuple
+        """
+        values = {}
+        if queryset is not None:
+            aggregates = {"count": Count("pk")}
+            if self._has_last_modified_field(queryset.model):
+                aggregates["last_modified"] = Max(self.last_modified_field)
+            values = queryset.aggregate(**aggregates)
+
+        versions = self.get_dependency_versions()
+
+        timestamps = [version / 1000 for version in versions if version is not None]
+        if values.get("last_modified"):
+            timestamps.append(values["last_modified"].timestamp())
+        last_modified = math.ceil(max(timestamps)) if timestamps else None
+
+        etag_data = [
+            self.request.get_full_path(),
+            self.request.accepted_renderer.format,
+            self.get_role_key(),
+            values.get("count"),
+            values.get("last_modified"),
+            *versions,
+        ]
+        etag = hashlib.sha1(repr(etag_data).encode()).hexdigest()
+        return quote_etag(etag), last_modified
+
+    def _get_conditional_response(self, queryset, view, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(queryset)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = view(request, *args, **kwargs)
+
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            if last_modified is not None:
+                response["Last-Modified"] = http_date(last_modified)
+        return response
+
+    def _has_last_modified_field(self, model):
+        try:
+            model._meta.get_field(self.last_modified_field)
+        except FieldDoesNotExist:
+            return False
+        return True
@@ -0,0 +1,79 @@
+import json
+
+from django.contrib.gis.db.models.functions import AsGeoJSON
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from rest_framework.decorators import action
+from rest_framework.renderers import BaseRenderer
+
+
+class GeoJSONRenderer(BaseRenderer):
+    media_type = "application/geo+json"
+    format = "geojson"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Only used for error responses, exports are streamed as they are
+        return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+
+class GeoJSONExportMixin:
+    """Viewset mixin adding a streaming GeoJSON export of the whole dataset
+
+    The export is available at <list url>/export.geojson. The rows are read
+    from a server-side cursor in chunks and the geometries are encoded to
+    GeoJSON in the database, so memory use does not grow with the size of
+    the dataset.
+    """
+
+    export_geometry_field = None
+    export_fields = ()
+    export_chunk_size = 2000
+
+    @action(
+        detail=False,
+        url_path="export",
+        renderer_classes=[GeoJSONRenderer],
+        pagination_class=None,
+    )
+    def export(self, request, *args, **kwargs):
+        qs = self.filter_queryset(self.get_queryset())
+        qs = (
+            qs.prefetch_related(None)
+            .annotate(export_geometry=AsGeoJSON(self.export_geometry_field))
+            .values_list("export_geometry", *self.export_fields)
+        )
+        response = StreamingHttpResponse(
+            self._stream_feature_collection(qs),
+            content_type=GeoJSONRenderer.media_type,
+        )
+        response["Content-Disposition"] = 'attachment; filename="{0}.geojson"'.format(
+            self.basename
+        )
+        return response
+
+    def get_export_properties(self, values):
+        """Return the GeoJSON properties for the exported field values"""
+        return values
+
+    def _stream_feature_collection(self, qs):
+        yield '{"type": "FeatureCollection", "features": ['
+        features = []
+        separator = ""
+        for geometry, *values in qs.iterator(chunk_size=self.export_chunk_size):
+            properties = self.get_export_properties(
+                dict(zip(self.export_fields, values))
+            )
+            features.append(
+                '{{"type": "Feature", "id": {0}, "geometry": {1}, "properties": {2}}}'.format(
+                    json.dumps(properties.get("id")),
+                    geometry or "null",
+                    json.dumps(properties, cls=DjangoJSONEncoder),
+                )
+            )
+            if len(features) >= self.export_chunk_size:
+                yield separator + ",".join(features)
+                features = []
+                separator = ","
+        if features:
+            yield separator + ",".join(features)
+        yield "]}"
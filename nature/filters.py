@@ -0,0 +1,129 @@
+from django.conf import settings
+from django.contrib.gis.gdal import GDALException
+from django.contrib.gis.geos import GEOSException, GEOSGeometry, Point, Polygon
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from nature.models import WGS84_SRID
+
+
+class SpatialFilter(BaseFilterBackend):
+    """Filter features by their geometry
+
+    Query parameters:
+
+    - bbox: xmin,ymin,xmax,ymax
+    - intersects: WKT or GeoJSON geometry
+    - dwithin: WKT or GeoJSON geometry, used together with distance
+    - distance: distance in meters
+    - contains_point: x,y
+    - srid: SRID of the given coordinates, either 4326 (default) or 3879
+
+    The input is transformed to the SRID of the geometry column in the
+    database, so that the filters can use its spatial index.
+    """
+
+    geometry_field = "geometry"
+    allowed_srids = (WGS84_SRID, settings.SRID)
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        srid = self._get_srid(params)
+
+        if "bbox" in params:
+            bbox = self._parse_coordinates(params["bbox"], "bbox", 4)
+            try:
+                geometry = Polygon.from_bbox(bbox)
+            except (ValueError, GEOSException):
+                raise ValidationError({"bbox": _("Invalid bounding box")})
+            geometry.srid = srid
+            queryset = self._filter(queryset, "intersects", geometry)
+
+        if "intersects" in params:
+            geometry = self._parse_geometry(params["intersects"], "intersects", srid)
+            queryset = self._filter(queryset, "intersects", geometry)
+
+        if "dwithin" in params:
+            geometry = self._parse_geometry(params["dwithin"], "dwithin", srid)
+            distance = self._get_distance(params)
+            queryset = self._filter(queryset, "dwithin", (geometry, distance))
+
+        if "contains_point" in params:
+            x, y = self._parse_coordinates(
+                params["contains_point"], "contains_point", 2
+            )
+            queryset = self._filter(queryset, "contains", Point(x, y, srid=srid))
+
+        return queryset
+
+    def get_schema_operation_parameters(self, view):
+        descriptions = {
+            "bbox": "Bounding box xmin,ymin,xmax,ymax",
+            "intersects": "WKT or GeoJSON geometry the feature intersects",
+            "dwithin": "WKT or GeoJSON geometry within distance of the feature",
+            "distance": "Distance in meters for dwithin",
+            "contains_point": "Point x,y contained by the feature",
+            "srid": "SRID of the coordinates, 4326 (default) or 3879",
+        }
+        return [
+            {
+                "name": name,
+                "required": False,
+                "in": "query",
+                "description": description,
+                "schema": {"type": "string"},
+            }
+            for name, description in descriptions.items()
+        ]
+
+    def _filter(self, queryset, lookup, value):
+        return queryset.filter(
+            **{"{0}__{1}".format(self.geometry_field, lookup): value}
+        )
+
+    def _get_srid(self, params):
+        try:
+            srid = int(params.get("srid", WGS84_SRID))
+        except ValueError:
+            srid = None
+        if srid not in self.allowed_srids:
+            raise ValidationError(
+                {
+                    "srid": _("SRID must be one of {0}").format(
+                        ", ".join(str(srid) for srid in self.allowed_srids)
+                    )
+                }
+            )
+        return srid
+
+    def _get_distance(self, params):
+        try:
+            distance = float(params["distance"])
+        except KeyError:
+            raise ValidationError({"distance": _("Distance is required for dwithin")})
+        except ValueError:
+            distance = -1
+        if not distance >= 0:
+            raise ValidationError({"distance": _("Invalid distance")})
+        return distance
+
+    def _parse_coordinates(self, value, param, count):
+        try:
+            coordinates = [float(c) for c in value.split(",")]
+        except ValueError:
+            coordinates = []
+        if len(coordinates) != count:
+            raise ValidationError(
+                {param: _("Expected {0} comma separated numbers").format(count)}
+            )
+        return coordinates
+
+    def _parse_geometry(self, value, param, srid):
+        try:
+            geometry = GEOSGeometry(value)
+        except (ValueError, GEOSException, GDALException):
+            raise ValidationError({param: _("Invalid WKT or GeoJSON geometry")})
+        # The srid parameter applies to all input, GeoJSON defaults to WGS84
+        geometry.srid = srid
+        return geometry
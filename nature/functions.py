@@ -0,0 +1,58 @@
+from django.contrib.gis.db.models import GeometryField
+from django.contrib.gis.db.models.functions import (
+    GeomOutputGeoFunc,
+    NumPoints,
+    Transform,
+)
+from django.db.models import Case, FloatField, Func, Value, When
+from django.db.models.functions import Greatest
+from django.db.models.lookups import GreaterThan
+
+from nature.models import WGS84_SRID
+
+
+class SimplifyPreserveTopology(GeomOutputGeoFunc):
+    function = "ST_SimplifyPreserveTopology"
+
+
+class BoundaryLength(Func):
+    """Perimeter of polygons or length of lines in units of the SRID"""
+
+    template = "(ST_Perimeter(%(expressions)s) + ST_Length(%(expressions)s))"
+    output_field = FloatField()
+
+
+def simplified_wgs84_geometry(tolerance=None, max_vertices=None):
+    """Expression for the simplified WGS84 geometry of a feature
+
+    The geometry is simplified in the project SRID, so the tolerance is given
+    in meters. Geometries with more vertices than max_vertices are simplified
+    with a tolerance derived from the length of their boundary, so that a
+    single huge geometry cannot dominate the size of a response.
+
+    The expression evaluates to NULL for geometries that are not simplified,
+    the stored geometry_wgs84 should be used for those.
+
+    :param tolerance: Simplification tolerance in meters
+    :param max_vertices: Number of vertices above which geometries are simplified
+    :return: Query expression or None if no simplification is requested
+    """
+
+    def simplify(tolerance):
+        return Transform(SimplifyPreserveTopology("geometry", tolerance), WGS84_SRID)
+
+    default = simplify(tolerance) if tolerance else None
+    if not max_vertices:
+        return default
+
+    capped_tolerance = BoundaryLength("geometry") / Value(max_vertices)
+    if tolerance:
+        capped_tolerance = Greatest(capped_tolerance, Value(tolerance))
+    return Case(
+        When(
+            GreaterThan(NumPoints("geometry_wgs84"), max_vertices),
+            then=simplify(capped_tolerance),
+        ),
+        default=default,
+        output_field=GeometryField(srid=WGS84_SRID),
+    )
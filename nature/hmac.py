@@ -3,16 +3,24 @@ import hashlib
 import hmac
 import re
 from datetime import datetime
+from functools import lru_cache
 
 import pytz
 from django.conf import settings
 from django.core.exceptions import PermissionDenied
 from django.utils import timezone
 from django.utils.encoding import force_bytes
-from sentry_sdk import capture_event
+from django.utils.functional import cached_property
 
 from hmac_auth.models import HMACGroup
+from .auth_events import auth_failure_reporter
 from .enums import UserRole
+from .registry import hmac_group_registry
+
+# key="value" pairs of the credentials of the authorization header
+CREDENTIALS_RE = re.compile(r'(\w+)="([^"]+)"')
+
+REQUIRED_CREDENTIALS = frozenset({"algorithm", "headers", "signature"})
 
 
 class HMACAuth:
@@ -38,6 +46,12 @@ class HMACAuth:
         ) or self.request.META.get("HTTP_AUTHORIZATION")
 
     @property
+    def is_hmac_request(self):
+        """Return True if the request has a hmac authorization header"""
+        auth_type = (self.auth_header or "").split(" ", maxsplit=1)[0]
+        return auth_type.lower() == "hmac"
+
+    @cached_property
     def is_valid(self):
         """Return True if the request is valid
 
@@ -53,38 +67,66 @@ class HMACAuth:
     @property
     def has_admin_group(self):
         """Return true if the user has an admin group"""
-        return any([group.is_admin_group for group in self.groups])
+        return HMACGroup.ADMIN in self.permission_levels
 
     @property
     def has_office_hki_group(self):
         """Return true if user has an office hki group"""
-        return any([group.is_office_hki_group for group in self.groups])
+        return HMACGroup.OFFICE_HKI in self.permission_levels
 
     @property
     def has_office_group(self):
         """Return true if user has an office group"""
-        return any([group.is_office_group for group in self.groups])
+        return HMACGroup.OFFICE in self.permission_levels
+
+    @property
+    def group_names(self):
+        return self.request.META.get("HTTP_X_FORWARDED_GROUPS", "").split(";")
 
     @property
     def groups(self):
-        group_names = self.request.META.get("HTTP_X_FORWARDED_GROUPS", "").split(";")
-        return HMACGroup.objects.filter(name__in=group_names)
+        return HMACGroup.objects.filter(name__in=self.group_names)
+
+    @cached_property
+    def permission_levels(self):
+        """Return the permission levels of the forwarded groups
+
+        The permission levels are looked up from the in-process map of
+        nature.registry instead of the database.
+        """
+        return hmac_group_registry.get_permission_levels(self.group_names)
 
     @property
     def user_role(self):
+        """Return the role of the user of the request
+
+        The role is resolved once per request and stored on the request.
+        Failures are stored as None, so that they are reported only once.
+        """
+        if not hasattr(self.request, "_hmac_user_role"):
+            try:
+                self.request._hmac_user_role = self._get_user_role()
+            except PermissionDenied:
+                self.request._hmac_user_role = None
+                raise
+        if self.request._hmac_user_role is None:
+            raise PermissionDenied()
+        return self.request._hmac_user_role
+
+    def _get_user_role(self):
         # seen as public access if no auth header provided
         if not self.auth_header:
             event = self._get_event(
                 "no-auth", "Authorization failed: no auth header provided"
             )
-            capture_event(event)
+            auth_failure_reporter.report(event)
             raise PermissionDenied()
 
         if not self.is_valid:
             event = self._get_event(
                 "invalid-auth", "Authorization failed: invalid auth header provided"
             )
-            capture_event(event)
+            auth_failure_reporter.report(event)
             raise PermissionDenied()
 
         if self.has_admin_group:
@@ -110,65 +152,66 @@ class HMACAuth:
             seconds=self.ALLOWED_CLOCK_SKEW_IN_SECONDS
         )
 
+    @cached_property
+    def auth_info(self):
+        """Return the credentials of a hmac authorization header as a dict
+
+        :return: The credentials or None if the header is not a hmac header
+        :rtype: dict
+        """
+        auth_type, __, credentials = self.auth_header.partition(" ")
+        if auth_type.lower() != "hmac":
+            return None
+        return dict(CREDENTIALS_RE.findall(credentials))
+
     @property
     def has_valid_credentials(self):
-        auth_type, credentials = self.auth_header.split(" ", maxsplit=1)
-        if auth_type.lower() != "hmac":
+        auth_info = self.auth_info
+        if auth_info is None:
             return False  # only hmac auth allowed
 
-        p = re.compile(r'(\w+)="([^"]+)"')
-        auth_info = dict(p.findall(credentials))
-
-        required_keys = {"algorithm", "headers", "signature"}
-        if not required_keys.issubset(auth_info):
+        if not REQUIRED_CREDENTIALS.issubset(auth_info):
             return False
 
-        algorithm = auth_info["algorithm"]
-        headers = auth_info["headers"].split(" ")
-        signature = auth_info["signature"]
-
-        meta_keys = [
-            "HTTP_{0}".format(header.replace("-", "_").upper()) for header in headers
-        ]
-        if not set(meta_keys).issubset(self.request.META):
+        digestmod = self.DIGEST_ALGORITHMS.get(auth_info["algorithm"])
+        if not digestmod:
             return False
 
-        signature_string = self._generate_signature_message(headers, meta_keys)
-        digestmod = self.DIGEST_ALGORITHMS.get(algorithm)
-        if not digestmod:
+        signature_fields = _get_signature_fields(auth_info["headers"])
+        if not all(meta_key in self.request.META for meta_key, __ in signature_fields):
             return False
+
+        signature_string = self._generate_signature_message(signature_fields)
         expected_signature = self._generate_signature(digestmod, signature_string)
-        return hmac.compare_digest(expected_signature, force_bytes(signature))
+        return hmac.compare_digest(
+            expected_signature, force_bytes(auth_info["signature"])
+        )
 
-    def _generate_signature_message(self, headers, meta_keys):
+    def _generate_signature_message(self, signature_fields):
         """Generate signature message
 
         See https://docs.konghq.com/hub/kong-inc/hmac-auth/#signature-string-construction
         for the specification of signature string construction
+
+        :param signature_fields: The META keys and line prefixes of the signed
+            headers, see _get_signature_fields
         """
-        header_lines = []
-        for header, meta_key in zip(headers, meta_keys):
-            if header.lower() == "request-line":
-                header_lines.append(self.request.META[meta_key])
-            else:
-                header_lines.append(
-                    "{0}: {1}".format(header.lower(), self.request.META[meta_key])
-                )
-        return "\n".join(header_lines)
+        meta = self.request.META
+        return "\n".join(
+            prefix + meta[meta_key] for meta_key, prefix in signature_fields
+        )
 
     def _generate_signature(self, digestmod, message):
-        hmac_obj = hmac.HMAC(
-            key=settings.SHARED_SECRET.encode("utf-8"),
-            msg=message.encode("utf-8"),
-            digestmod=digestmod,
-        )
+        hmac_obj = _get_keyed_hmac(settings.SHARED_SECRET, digestmod).copy()
+        hmac_obj.update(message.encode("utf-8"))
         return base64.b64encode(hmac_obj.digest())
 
     def _get_event(self, event_type, message):
         return {
             "type": event_type,
-            "headers": self.request.headers,
-            "path": self.request.get_full_path(),
+            "headers": dict(self.request.headers),
+            "path": self.request.path,
+            "full-path": self.request.get_full_path(),
             "ip-address": self._get_client_ip(),
             "message": message,
         }
@@ -180,3 +223,29 @@ class HMACAuth:
         else:
             ip = self.request.META.get("REMOTE_ADDR")
         return ip
+
+
+@lru_cache(maxsize=64)
+def _get_signature_fields(headers):
+    """Return the META keys and the signature line prefixes of the signed headers
+
+    The request line is signed as it is and the other headers as
+    "name: value" lines.
+
+    :param headers: The space separated header names of the credentials
+    :rtype: tuple
+    """
+    fields = []
+    for header in headers.split(" "):
+        meta_key = "HTTP_{0}".format(header.replace("-", "_").upper())
+        if header.lower() == "request-line":
+            fields.append((meta_key, ""))
+        else:
+            fields.append((meta_key, "{0}: ".format(header.lower())))
+    return tuple(fields)
+
+
+@lru_cache(maxsize=8)
+def _get_keyed_hmac(secret, digestmod):
+    """Return a hmac object keyed with the secret, to be copied for each message"""
+    return hmac.new(secret.encode("utf-8"), digestmod=digestmod)
@@ -0,0 +1,61 @@
+import re
+
+from django.urls import NoReverseMatch
+from rest_framework.reverse import reverse
+
+# Lookup values that reverse() puts into URLs as they are
+SAFE_LOOKUP_VALUE = re.compile(r"[A-Za-z0-9_~-]+")
+
+LOOKUP_PLACEHOLDER = "__lookup__"
+
+
+def cached_reverse(viewname, args=None, kwargs=None, request=None, format=None):
+    """Return the same URL as rest_framework.reverse.reverse using URL templates
+
+    The URL of a view is reversed once per request with a placeholder as the
+    lookup value, and the URLs of the objects are formatted by replacing the
+    placeholder with their lookup values. URLs that take other arguments or
+    lookup values that would be quoted are reversed as usual.
+    """
+    if args or request is None or not kwargs or len(kwargs) != 1:
+        return reverse(viewname, args, kwargs, request, format)
+
+    [(lookup_url_kwarg, value)] = kwargs.items()
+    value = str(value)
+    if not SAFE_LOOKUP_VALUE.fullmatch(value):
+        return reverse(viewname, args, kwargs, request, format)
+
+    template = _get_url_template(request, viewname, lookup_url_kwarg, format)
+    if template is None:
+        return reverse(viewname, args, kwargs, request, format)
+    return template.replace(LOOKUP_PLACEHOLDER, value)
+
+
+def _get_url_template(request, viewname, lookup_url_kwarg, format):
+    templates = getattr(request, "_url_templates", None)
+    if templates is None:
+        templates = request._url_templates = {}
+
+    key = (viewname, lookup_url_kwarg, format)
+    if key not in templates:
+        try:
+            template = reverse(
+                viewname,
+                kwargs={lookup_url_kwarg: LOOKUP_PLACEHOLDER},
+                request=request,
+                format=format,
+            )
+        except NoReverseMatch:
+            template = None
+        if template is not None and template.count(LOOKUP_PLACEHOLDER) != 1:
+            template = None
+        templates[key] = template
+    return templates[key]
+
+
+class CachedReverseMixin:
+    """Hyperlinked field mixin building the URLs with cached_reverse"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reverse = cached_reverse
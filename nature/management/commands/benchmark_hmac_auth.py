@@ -0,0 +1,78 @@
+import base64
+import hashlib
+import hmac
+import timeit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.utils.http import http_date
+
+from nature.hmac import HMACAuth
+
+
+class Command(BaseCommand):
+    help = "Measure the time spent authenticating a hmac request"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--number",
+            type=int,
+            default=10000,
+            help="Number of authentications per measurement",
+        )
+        parser.add_argument(
+            "--groups",
+            default="",
+            help="Semicolon separated X-Forwarded-Groups of the request",
+        )
+
+    def handle(self, *args, **options):
+        request = self._get_request(options["groups"])
+        self.stdout.write(
+            "Role of the request: {0}".format(HMACAuth(request).user_role.name)
+        )
+
+        def validate():
+            return HMACAuth(request).is_valid
+
+        def resolve():
+            # Resolve the role again instead of reading it from the request
+            del request._hmac_user_role
+            return HMACAuth(request).user_role
+
+        def read():
+            return HMACAuth(request).user_role
+
+        number = options["number"]
+        for name, func in (
+            ("signature validation", validate),
+            ("role resolution", resolve),
+            ("resolved role", read),
+        ):
+            seconds = min(timeit.repeat(func, number=number, repeat=3))
+            self.stdout.write(
+                "{0}: {1:.2f} µs per request".format(name, seconds / number * 1e6)
+            )
+
+    def _get_request(self, groups):
+        date = http_date()
+        request_line = "GET /v1/feature/ HTTP/1.1"
+        message = "date: {0}\n{1}".format(date, request_line)
+        signature = base64.b64encode(
+            hmac.new(
+                settings.SHARED_SECRET.encode("utf-8"),
+                message.encode("utf-8"),
+                hashlib.sha256,
+            ).digest()
+        ).decode()
+        return RequestFactory().get(
+            "/v1/feature/",
+            HTTP_DATE=date,
+            HTTP_REQUEST_LINE=request_line,
+            HTTP_PROXY_AUTHORIZATION=(
+                'hmac username="benchmark", algorithm="hmac-sha256", '
+                'headers="date request-line", signature="{0}"'.format(signature)
+            ),
+            HTTP_X_FORWARDED_GROUPS=groups,
+        )
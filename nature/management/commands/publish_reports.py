@@ -0,0 +1,470 @@
+import hashlib
+import json
+import os
+import shutil
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count, Max, Sum
+from django.http import Http404
+from django.test import RequestFactory
+from django.urls import reverse
+from django.utils import translation
+
+from nature.enums import UserRole
+from nature.models import (
+    Abundance,
+    BreedingDegree,
+    Feature,
+    FeatureClass,
+    FeatureLink,
+    Frequency,
+    HabitatType,
+    HabitatTypeObservation,
+    LinkType,
+    MigrationClass,
+    Observation,
+    ObservationSeries,
+    Occurrence,
+    Origin,
+    Publication,
+    PublicationType,
+    Regulation,
+    Species,
+    Transaction,
+    TransactionRegulation,
+    TransactionType,
+    Value,
+)
+from nature.views import (
+    FeatureReportView,
+    ObservationSeriesReportView,
+    SpeciesReportView,
+)
+
+STATE_FILE_NAME = ".publish-state.json"
+
+PublishedReport = namedtuple(
+    "PublishedReport", ["view_class", "get_queryset", "get_changed_pks", "initkwargs"]
+)
+
+
+def get_www_features():
+    return Feature.objects.www()
+
+
+def get_www_species():
+    return Species.objects.www()
+
+
+def get_www_observation_series():
+    return ObservationSeries.objects.filter(
+        pk__in=Observation.objects.www().values("series_id")
+    )
+
+
+def _get_fingerprint(values):
+    return hashlib.sha1(repr(values).encode()).hexdigest()[:16]
+
+
+def _get_row_fingerprints(model):
+    """Fingerprints of the rows of a model without last_modified_time"""
+    fields = [field.attname for field in model._meta.concrete_fields]
+    rows = model.objects.order_by().values_list("pk", *fields)
+    return {row[0]: _get_fingerprint(row[1:]) for row in rows}
+
+
+def _get_modified_fingerprints(model):
+    return {
+        pk: _get_fingerprint(last_modified_time)
+        for pk, last_modified_time in model.objects.order_by().values_list(
+            "pk", "last_modified_time"
+        )
+    }
+
+
+def _get_grouped_fingerprints(model, field):
+    """Fingerprints of the rows of a model grouped by field
+
+    Used for the objects without last_modified_time shown in the reports,
+    e.g. the transactions grouped by the features they are linked to. The
+    fingerprint changes when objects are linked or unlinked or modified.
+    """
+    fields = [f.attname for f in model._meta.concrete_fields]
+    rows = model.objects.order_by(field, "pk").values_list(field, *fields)
+    groups = {}
+    for row in rows:
+        if row[0] is not None:
+            groups.setdefault(row[0], []).append(row[1:])
+    return {key: _get_fingerprint(values) for key, values in groups.items()}
+
+
+# Code lists shown in all kinds of reports, all reports are rendered when
+# they change
+CODE_LIST_MODELS = (
+    Abundance,
+    BreedingDegree,
+    Frequency,
+    HabitatType,
+    LinkType,
+    MigrationClass,
+    Occurrence,
+    Origin,
+    PublicationType,
+    TransactionType,
+)
+
+
+def _get_code_list_fingerprints():
+    rows = [sorted(_get_row_fingerprints(model).items()) for model in CODE_LIST_MODELS]
+    return {0: _get_fingerprint(rows)}
+
+
+def _get_related_fingerprints(model, field):
+    """Fingerprints of the related objects of each object
+
+    The fingerprint changes when related objects are added, deleted or
+    modified, since modifying an object updates its last_modified_time.
+    """
+    rows = (
+        model.objects.order_by()
+        .values(field)
+        .annotate(
+            count=Count("pk"),
+            pk_sum=Sum("pk"),
+            modified=Max("last_modified_time"),
+        )
+        .values_list(field, "count", "pk_sum", "modified")
+    )
+    return {row[0]: _get_fingerprint(row[1:]) for row in rows if row[0] is not None}
+
+
+# Data the reports are rendered from, by names of the fingerprint sets in the
+# state file
+SOURCES = {
+    "feature": partial(_get_modified_fingerprints, Feature),
+    "feature-class": partial(_get_grouped_fingerprints, FeatureClass, "features"),
+    "feature-links": partial(_get_grouped_fingerprints, FeatureLink, "feature"),
+    "feature-values": partial(_get_grouped_fingerprints, Value, "features"),
+    "feature-publications": partial(_get_grouped_fingerprints, Publication, "features"),
+    "feature-transactions": partial(_get_grouped_fingerprints, Transaction, "features"),
+    "feature-transaction-regulations": partial(
+        _get_grouped_fingerprints, TransactionRegulation, "transaction__features"
+    ),
+    "feature-regulations": partial(
+        _get_grouped_fingerprints, Regulation, "transactions__features"
+    ),
+    "species": partial(_get_row_fingerprints, Species),
+    "species-regulations": partial(_get_grouped_fingerprints, Regulation, "species"),
+    "observationseries": partial(_get_row_fingerprints, ObservationSeries),
+    "feature-observations": partial(_get_related_fingerprints, Observation, "feature"),
+    "species-observations": partial(_get_related_fingerprints, Observation, "species"),
+    "observationseries-observations": partial(
+        _get_related_fingerprints, Observation, "series"
+    ),
+    "feature-habitattypeobservations": partial(
+        _get_related_fingerprints, HabitatTypeObservation, "feature"
+    ),
+    "code-lists": _get_code_list_fingerprints,
+}
+
+# Sources of the feature reports
+FEATURE_SOURCES = (
+    "feature",
+    "feature-class",
+    "feature-links",
+    "feature-values",
+    "feature-publications",
+    "feature-transactions",
+    "feature-transaction-regulations",
+    "feature-regulations",
+    "feature-observations",
+    "feature-habitattypeobservations",
+)
+# Sources of the features and species shown in the observations of the
+# reports of other objects
+SHOWN_FEATURE_SOURCES = ("feature", "feature-class")
+SHOWN_SPECIES_SOURCES = ("species", "species-regulations")
+
+
+def _get_observed(field, pks, target_field):
+    """Return the ids of target_field of the observations with field in pks"""
+    if not pks:
+        return set()
+    return set(
+        Observation.objects.filter(**{field + "__in": pks})
+        .order_by()
+        .values_list(target_field, flat=True)
+        .distinct()
+    )
+
+
+def _get_changed(changes, names):
+    return set().union(*(changes[name] for name in names))
+
+
+def get_changed_features(changes):
+    species_pks = _get_changed(changes, SHOWN_SPECIES_SOURCES)
+    return _get_changed(changes, FEATURE_SOURCES) | _get_observed(
+        "species", species_pks, "feature"
+    )
+
+
+def get_changed_species(changes):
+    feature_pks = _get_changed(changes, SHOWN_FEATURE_SOURCES)
+    return (
+        _get_changed(changes, SHOWN_SPECIES_SOURCES)
+        | changes["species-observations"]
+        | _get_observed("feature", feature_pks, "species")
+    )
+
+
+def get_changed_observation_series(changes):
+    feature_pks = _get_changed(changes, SHOWN_FEATURE_SOURCES)
+    species_pks = _get_changed(changes, SHOWN_SPECIES_SOURCES)
+    return (
+        changes["observationseries"]
+        | changes["observationseries-observations"]
+        | _get_observed("feature", feature_pks, "series")
+        | _get_observed("species", species_pks, "series")
+    )
+
+
+# Published reports by URL names
+REPORTS = {
+    "feature-report": PublishedReport(
+        FeatureReportView,
+        get_www_features,
+        get_changed_features,
+        {"user_role": UserRole.PUBLIC, "cache_timeout": 0, "pdf_link": False},
+    ),
+    "species-report": PublishedReport(
+        SpeciesReportView,
+        get_www_species,
+        get_changed_species,
+        # The static reports include all observations instead of loading them
+        {
+            "user_role": UserRole.PUBLIC,
+            "cache_timeout": 0,
+            "observation_pages_url_name": None,
+            "pdf_link": False,
+        },
+    ),
+    "observationseries-report": PublishedReport(
+        ObservationSeriesReportView,
+        get_www_observation_series,
+        get_changed_observation_series,
+        {},
+    ),
+}
+
+
+def get_report_path(url_name, pk):
+    """Return the URL path of a report, e.g. /ltj/feature-report/1/"""
+    return reverse("nature:" + url_name, kwargs={"pk": pk})
+
+
+def get_report_file(output_dir, url_name, pk):
+    path = get_report_path(url_name, pk).strip("/")
+    return os.path.join(output_dir, path, "index.html")
+
+
+def render_reports(output_dir, url_name, pks, host):
+    """Render the reports of the given objects to their files
+
+    Runs in the worker processes of the pool.
+
+    :return: The number of written reports
+    :rtype: int
+    """
+    report = REPORTS[url_name]
+    view = report.view_class.as_view(**report.initkwargs)
+    factory = RequestFactory(HTTP_HOST=host)
+    count = 0
+    with translation.override(settings.LANGUAGE_CODE):
+        for pk in pks:
+            request = factory.get(get_report_path(url_name, pk))
+            request.user = AnonymousUser()
+            try:
+                response = view(request, pk=pk)
+            except Http404:
+                # The object was deleted or hidden after listing it
+                continue
+            response.render()
+            _write_file(get_report_file(output_dir, url_name, pk), response.content)
+            count += 1
+    return count
+
+
+def _write_file(filename, content):
+    # Replace the file atomically, so the web server never serves partial reports
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    tmp_filename = filename + ".tmp"
+    with open(tmp_filename, "wb") as f:
+        f.write(content)
+    os.replace(tmp_filename, filename)
+
+
+def _init_worker():
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the reports of www features, species and observation series "
+        "to static HTML files, re-rendering only the reports whose data has "
+        "changed since the previous run"
+    )
+
+    chunk_size = 100
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output-dir",
+            default=settings.REPORT_PUBLISH_ROOT,
+            help="Directory of the published reports, REPORT_PUBLISH_ROOT by default",
+        )
+        parser.add_argument(
+            "--host",
+            help="Host name used in the links of the reports, "
+            "the first of ALLOWED_HOSTS by default",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=os.cpu_count(),
+            help="Number of rendering processes, 1 renders in this process",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Render all reports instead of the changed ones",
+        )
+
+    def handle(self, *args, **options):
+        output_dir = options["output_dir"]
+        host = options["host"] or self._get_default_host()
+        state = {} if options["full"] else self._read_state(output_dir)
+        fingerprints = {
+            name: get_fingerprints() for name, get_fingerprints in SOURCES.items()
+        }
+        changes = self._get_changes(state.get("fingerprints"), fingerprints)
+
+        jobs = []
+        for url_name, report in REPORTS.items():
+            pks = set(report.get_queryset().values_list("pk", flat=True))
+            self._remove_reports(output_dir, url_name, pks)
+            changed_pks = self._get_changed_pks(
+                output_dir, url_name, report, pks, changes
+            )
+            jobs.append((url_name, sorted(changed_pks)))
+
+        counts = {url_name: 0 for url_name in REPORTS}
+        if options["processes"] <= 1:
+            for url_name, pks in jobs:
+                counts[url_name] += render_reports(output_dir, url_name, pks, host)
+        else:
+            self._render_in_processes(
+                output_dir, jobs, host, options["processes"], counts
+            )
+
+        self._write_state(output_dir, {"fingerprints": fingerprints})
+        for url_name, count in counts.items():
+            self.stdout.write("Published {0} reports of {1}".format(count, url_name))
+
+    def _render_in_processes(self, output_dir, jobs, host, processes, counts):
+        # The workers must not share the database connection of this process
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=processes, initializer=_init_worker
+        ) as executor:
+            futures = {}
+            for url_name, pks in jobs:
+                for chunk in self._get_chunks(pks):
+                    future = executor.submit(
+                        render_reports, output_dir, url_name, chunk, host
+                    )
+                    futures[future] = url_name
+            for future in as_completed(futures):
+                counts[futures[future]] += future.result()
+
+    def _get_chunks(self, pks):
+        for start in range(0, len(pks), self.chunk_size):
+            end = start + self.chunk_size
+            yield pks[start:end]
+
+    def _get_changes(self, previous_fingerprints, fingerprints):
+        """Return the ids whose fingerprints differ from the previous run by sources
+
+        :return: The changed ids by SOURCES names, or None if there is no
+            previous run to compare with
+        :rtype: dict
+        """
+        if not previous_fingerprints or set(previous_fingerprints) != set(SOURCES):
+            return None
+
+        changes = {}
+        for name, current in fingerprints.items():
+            # The keys of the state file are strings
+            previous = {
+                int(pk): fingerprint
+                for pk, fingerprint in previous_fingerprints[name].items()
+            }
+            changes[name] = {
+                pk
+                for pk in current.keys() | previous.keys()
+                if current.get(pk) != previous.get(pk)
+            }
+        return changes
+
+    def _get_changed_pks(self, output_dir, url_name, report, pks, changes):
+        """Return the ids of the objects whose reports must be rendered
+
+        Reports are rendered when their files are missing or their data has
+        changed since the previous run, see SOURCES. All reports are rendered
+        if there is no previous run or the code lists have changed.
+        """
+        if changes is None or changes["code-lists"]:
+            return pks
+
+        missing_pks = {
+            pk
+            for pk in pks
+            if not os.path.exists(get_report_file(output_dir, url_name, pk))
+        }
+        return missing_pks | (report.get_changed_pks(changes) & pks)
+
+    def _remove_reports(self, output_dir, url_name, pks):
+        """Remove the reports of the objects that are no longer published"""
+        report_dir = os.path.dirname(
+            os.path.dirname(get_report_file(output_dir, url_name, 0))
+        )
+        if not os.path.isdir(report_dir):
+            return
+        for name in os.listdir(report_dir):
+            if name.isdigit() and int(name) not in pks:
+                shutil.rmtree(os.path.join(report_dir, name))
+
+    def _get_default_host(self):
+        for host in settings.ALLOWED_HOSTS:
+            if host and host != "*" and not host.startswith("."):
+                return host
+        raise CommandError("Give the host name of the reports with --host")
+
+    def _read_state(self, output_dir):
+        try:
+            with open(os.path.join(output_dir, STATE_FILE_NAME)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write_state(self, output_dir, state):
+        _write_file(
+            os.path.join(output_dir, STATE_FILE_NAME), json.dumps(state).encode()
+        )
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from nature.models import (
+    Feature,
+    FeatureObservationCount,
+    Species,
+    SpeciesObservationCount,
+)
+
+
+class Command(BaseCommand):
+    help = "Recompute the observation counts of all features and species"
+
+    def handle(self, *args, **options):
+        for model, counter_model in (
+            (Feature, FeatureObservationCount),
+            (Species, SpeciesObservationCount),
+        ):
+            ids = list(model.objects.values_list("pk", flat=True))
+            counter_model.update_counts(ids)
+            self.stdout.write(
+                "Updated observation counts of {0} {1}".format(
+                    len(ids), model._meta.verbose_name_plural
+                )
+            )
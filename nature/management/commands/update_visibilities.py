@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from nature.models import Feature, Species
+
+
+class Command(BaseCommand):
+    help = "Recompute the visibility of features and species"
+
+    def handle(self, *args, **options):
+        feature_count = Feature.objects.update_visibility()
+        species_count = Species.objects.update_visibility()
+        self.stdout.write(
+            "Updated visibilities of {0} features and {1} species".format(
+                feature_count, species_count
+            )
+        )
@@ -0,0 +1,22 @@
+from django.contrib.gis.db.models.functions import Transform
+from django.core.management.base import BaseCommand
+
+from nature.models import WGS84_SRID, Feature
+
+
+class Command(BaseCommand):
+    help = "Populate the WGS84 geometries of features from their geometries"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--missing-only",
+            action="store_true",
+            help="Only populate features that do not have a WGS84 geometry yet",
+        )
+
+    def handle(self, *args, **options):
+        qs = Feature.objects.all()
+        if options["missing_only"]:
+            qs = qs.filter(geometry_wgs84__isnull=True)
+        count = qs.update(geometry_wgs84=Transform("geometry", WGS84_SRID))
+        self.stdout.write("Updated WGS84 geometries of {0} features".format(count))
@@ -0,0 +1,33 @@
+from django.core.exceptions import PermissionDenied
+
+from .hmac import HMACAuth
+
+
+class HMACAuthMiddleware:
+    """Validate the hmac authorization of requests once
+
+    Sets request.user_role to the UserRole of requests with a valid hmac
+    authorization header and to None otherwise. Requests are not rejected
+    here, views decide what to do with invalid hmac requests: the reports of
+    nature.views raise PermissionDenied, the API responds 401 through
+    nature.authentication.HMACAuthentication and the vector tiles serve open
+    data. Requests without a hmac header get open data from the API.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.user_role = get_user_role(request)
+        return self.get_response(request)
+
+
+def get_user_role(request):
+    """Return the UserRole of a hmac request or None"""
+    hmac_auth = HMACAuth(request)
+    if not hmac_auth.is_hmac_request:
+        return None
+    try:
+        return hmac_auth.user_role
+    except PermissionDenied:
+        return None
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.13 on 2026-10-18 07:21
+
+import nature.models
+from django.contrib.gis.db.models.functions import Transform
+from django.db import migrations
+
+
+def populate_geometry_wgs84(apps, schema_editor):
+    Feature = apps.get_model("nature", "Feature")
+    Feature.objects.update(geometry_wgs84=Transform("geometry", 4326))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("nature", "0018_publication_ordering"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="feature",
+            name="geometry_wgs84",
+            field=nature.models.PermissiveGeometryField(
+                blank=True,
+                db_column="geometry_wgs84",
+                editable=False,
+                null=True,
+                srid=4326,
+                verbose_name="geometry (WGS84)",
+            ),
+        ),
+        migrations.RunPython(populate_geometry_wgs84, migrations.RunPython.noop),
+    ]
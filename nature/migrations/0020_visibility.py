@@ -0,0 +1,52 @@
+# Generated by Django 5.2.13 on 2026-10-18 07:35
+
+import nature.models
+from django.db import migrations
+
+POPULATE_FEATURE_VISIBILITY = """
+UPDATE kohde SET nakyvyys = 1
+    + CASE WHEN kohde.suojaustasoid >= 2 THEN 2 ELSE 0 END
+    + CASE WHEN kohde.suojaustasoid >= 2 AND luokka.tunnus <> 'UHEX' THEN 4 ELSE 0 END
+    + CASE WHEN kohde.suojaustasoid >= 3 THEN 8 ELSE 0 END
+    + CASE WHEN kohde.suojaustasoid >= 3 AND luokka.avoin_data THEN 16 ELSE 0 END
+    + CASE WHEN kohde.suojaustasoid >= 3 AND luokka.www THEN 32 ELSE 0 END
+FROM luokka WHERE luokka.tunnus = kohde.luokkatunnus
+"""
+
+POPULATE_SPECIES_VISIBILITY = """
+UPDATE lajirekisteri SET nakyvyys = 1
+    + CASE WHEN suojaustasoid >= 2 THEN 2 + 4 ELSE 0 END
+    + CASE WHEN suojaustasoid >= 3 THEN 8 + 16 + 32 ELSE 0 END
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("nature", "0019_feature_geometry_wgs84"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="feature",
+            name="visibility",
+            field=nature.models.VisibilityField(
+                db_column="nakyvyys",
+                default=0,
+                editable=False,
+                verbose_name="visibility",
+            ),
+        ),
+        migrations.AddField(
+            model_name="species",
+            name="visibility",
+            field=nature.models.VisibilityField(
+                db_column="nakyvyys",
+                default=0,
+                editable=False,
+                verbose_name="visibility",
+            ),
+        ),
+        migrations.RunSQL(POPULATE_FEATURE_VISIBILITY, migrations.RunSQL.noop),
+        migrations.RunSQL(POPULATE_SPECIES_VISIBILITY, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,118 @@
+# Generated by Django 5.2.13 on 2026-10-18 07:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("nature", "0020_visibility"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FeatureObservationCount",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "role",
+                    models.CharField(
+                        choices=[
+                            ("ADMIN", "ADMIN"),
+                            ("OFFICE_HKI", "OFFICE_HKI"),
+                            ("OFFICE", "OFFICE"),
+                            ("PUBLIC", "PUBLIC"),
+                            ("OPEN_DATA", "OPEN_DATA"),
+                            ("WWW", "WWW"),
+                        ],
+                        db_column="rooli",
+                        max_length=10,
+                        verbose_name="role",
+                    ),
+                ),
+                (
+                    "count",
+                    models.PositiveIntegerField(
+                        db_column="lkm", default=0, verbose_name="count"
+                    ),
+                ),
+                (
+                    "feature",
+                    models.ForeignKey(
+                        db_column="kohdeid",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="observation_counts",
+                        to="nature.feature",
+                        verbose_name="feature",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "feature observation count",
+                "verbose_name_plural": "feature observation counts",
+                "db_table": "kohde_havaintomaara",
+                "unique_together": {("feature", "role")},
+            },
+        ),
+        migrations.CreateModel(
+            name="SpeciesObservationCount",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "role",
+                    models.CharField(
+                        choices=[
+                            ("ADMIN", "ADMIN"),
+                            ("OFFICE_HKI", "OFFICE_HKI"),
+                            ("OFFICE", "OFFICE"),
+                            ("PUBLIC", "PUBLIC"),
+                            ("OPEN_DATA", "OPEN_DATA"),
+                            ("WWW", "WWW"),
+                        ],
+                        db_column="rooli",
+                        max_length=10,
+                        verbose_name="role",
+                    ),
+                ),
+                (
+                    "count",
+                    models.PositiveIntegerField(
+                        db_column="lkm", default=0, verbose_name="count"
+                    ),
+                ),
+                (
+                    "species",
+                    models.ForeignKey(
+                        db_column="lajid",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="observation_counts",
+                        to="nature.species",
+                        verbose_name="species",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "species observation count",
+                "verbose_name_plural": "species observation counts",
+                "db_table": "laji_havaintomaara",
+                "unique_together": {("species", "role")},
+            },
+        ),
+    ]
@@ -7,11 +7,22 @@
 # Feel free to rename the models, but don't rename db_table values or field names.
 from __future__ import unicode_literals
 
+import logging
+import operator
+from functools import reduce
+
 from django.conf import settings
 from django.contrib.gis.db import models
+from django.contrib.gis.db.models.functions import Transform
+from django.contrib.gis.gdal import GDALException
+from django.contrib.gis.geos import GEOSGeometry
 from django.db.models import F, Prefetch
+from django.db.models.lookups import GreaterThanOrEqual
 from django.utils.translation import gettext_lazy as _
 
+from nature.caching import bump_model_version
+from nature.registry import feature_class_registry, get_feature_class_infos
+
 PROTECTION_LEVELS = {
     "ADMIN": 1,
     "OFFICE": 2,
@@ -20,6 +31,142 @@ PROTECTION_LEVELS = {
 
 OFFICE_HKI_ONLY_FEATURE_CLASS_ID = "UHEX"
 
+# Bits of the visibility bitmask, one for each data set of the querysets
+VISIBILITY = {
+    "ADMIN": 1,
+    "OFFICE_HKI": 2,
+    "OFFICE": 4,
+    "PUBLIC": 8,
+    "OPEN_DATA": 16,
+    "WWW": 32,
+}
+
+# Lowest protection level of the objects in each visibility data set
+VISIBILITY_PROTECTION_LEVELS = {
+    "ADMIN": PROTECTION_LEVELS["ADMIN"],
+    "OFFICE_HKI": PROTECTION_LEVELS["OFFICE"],
+    "OFFICE": PROTECTION_LEVELS["OFFICE"],
+    "PUBLIC": PROTECTION_LEVELS["PUBLIC"],
+    "OPEN_DATA": PROTECTION_LEVELS["PUBLIC"],
+    "WWW": PROTECTION_LEVELS["PUBLIC"],
+}
+
+# Fields the visibility of a feature is computed from
+FEATURE_VISIBILITY_FIELDS = ("protection_level", "feature_class", "feature_class_id")
+
+WGS84_SRID = 4326
+
+logger = logging.getLogger(__name__)
+
+
+def to_wgs84(geometry):
+    """Transform a geometry in the project SRID to WGS84
+
+    Query expressions are wrapped in a database side transformation. Geometries
+    that cannot be projected to WGS84 are logged and returned as None.
+    """
+    if geometry is None:
+        return None
+    if not isinstance(geometry, GEOSGeometry):
+        return Transform(geometry, WGS84_SRID)
+    if geometry.srid is None:
+        geometry = geometry.clone()
+        geometry.srid = settings.SRID
+    try:
+        return geometry.transform(WGS84_SRID, clone=True)
+    except GDALException:
+        logger.warning("Could not transform geometry %s to WGS84", geometry.ewkt)
+        return None
+
+
+def get_visibility(protection_level, feature_class=None):
+    """Return the visibility bitmask of an object
+
+    :param protection_level: Protection level of the object
+    :param feature_class: FeatureClass or FeatureClassInfo of a feature, None
+        for other objects
+    :return: The VISIBILITY bits of the data sets the object belongs to
+    :rtype: int
+    """
+    visibility = VISIBILITY["ADMIN"]
+    if protection_level >= PROTECTION_LEVELS["OFFICE"]:
+        visibility |= VISIBILITY["OFFICE_HKI"]
+        if (
+            feature_class is None
+            or feature_class.id != OFFICE_HKI_ONLY_FEATURE_CLASS_ID
+        ):
+            visibility |= VISIBILITY["OFFICE"]
+    if protection_level >= PROTECTION_LEVELS["PUBLIC"]:
+        visibility |= VISIBILITY["PUBLIC"]
+        if feature_class is None or feature_class.open_data:
+            visibility |= VISIBILITY["OPEN_DATA"]
+        if feature_class is None or feature_class.www:
+            visibility |= VISIBILITY["WWW"]
+    return visibility
+
+
+def visibility_expression(protection_level, office=True, open_data=True, www=True):
+    """Return a database expression computing the visibility bitmask of rows
+
+    The database counterpart of get_visibility. The feature class conditions
+    are either booleans or conditional expressions evaluated for each row.
+    """
+    if not hasattr(protection_level, "resolve_expression"):
+        protection_level = models.Value(
+            protection_level, output_field=models.IntegerField()
+        )
+    is_office = GreaterThanOrEqual(protection_level, PROTECTION_LEVELS["OFFICE"])
+    is_public = GreaterThanOrEqual(protection_level, PROTECTION_LEVELS["PUBLIC"])
+    conditions = [
+        ("OFFICE_HKI", is_office, True),
+        ("OFFICE", is_office, office),
+        ("PUBLIC", is_public, True),
+        ("OPEN_DATA", is_public, open_data),
+        ("WWW", is_public, www),
+    ]
+    bits = [models.Value(VISIBILITY["ADMIN"])]
+    for name, condition, feature_class_condition in conditions:
+        if feature_class_condition is False:
+            continue
+        if feature_class_condition is not True:
+            condition = models.Q(condition) & models.Q(feature_class_condition)
+        bits.append(
+            models.Case(
+                models.When(condition, then=models.Value(VISIBILITY[name])),
+                default=models.Value(0),
+            )
+        )
+    return reduce(operator.add, bits)
+
+
+def feature_visibility_expression(protection_level=None, feature_class=None):
+    """Return a database expression computing the visibility bitmask of features
+
+    :param protection_level: New protection level of the features, by default
+        the current one of each feature
+    :param feature_class: New FeatureClass or FeatureClassInfo of the features,
+        by default the current one of each feature
+    """
+    if protection_level is None:
+        protection_level = F("protection_level")
+    if feature_class is None:
+        # The flags of the feature classes are read from the database with
+        # subqueries, the stored visibility must not depend on the registry
+        return visibility_expression(
+            protection_level,
+            office=~models.Q(feature_class_id=OFFICE_HKI_ONLY_FEATURE_CLASS_ID),
+            open_data=models.Q(
+                feature_class_id__in=FeatureClass.objects.open_data().values("pk")
+            ),
+            www=models.Q(feature_class_id__in=FeatureClass.objects.www().values("pk")),
+        )
+    return visibility_expression(
+        protection_level,
+        office=feature_class.id != OFFICE_HKI_ONLY_FEATURE_CLASS_ID,
+        open_data=feature_class.open_data,
+        www=feature_class.www,
+    )
+
 
 class ProtectionLevelQuerySet(models.QuerySet):
     """
@@ -70,6 +217,55 @@ class ProtectionLevelQuerySet(models.QuerySet):
         return self.for_public()
 
 
+class VisibilityQuerySetMixin:
+    """
+    Implements the protection level filter methods with visibility_q
+    """
+
+    def visibility_q(self, name):
+        """Return the filter of the objects in a VISIBILITY data set"""
+        raise NotImplementedError
+
+    def for_admin(self):
+        return self
+
+    def for_office_hki(self):
+        return self.filter(self.visibility_q("OFFICE_HKI"))
+
+    def for_office(self):
+        return self.filter(self.visibility_q("OFFICE"))
+
+    def for_public(self):
+        return self.filter(self.visibility_q("PUBLIC"))
+
+    def open_data(self):
+        return self.filter(self.visibility_q("OPEN_DATA"))
+
+    def www(self):
+        return self.filter(self.visibility_q("WWW"))
+
+    def visibility_counts(self):
+        """Count the objects in each VISIBILITY data set in a single query
+
+        :return: The numbers of objects by VISIBILITY names
+        :rtype: dict
+        """
+        return self.aggregate(**self.visibility_count_aggregates())
+
+    def visibility_count_aggregates(self):
+        """Return the Count aggregates of visibility_counts by VISIBILITY names"""
+        return {
+            name: models.Count("pk", filter=self.visibility_q(name))
+            for name in VISIBILITY
+        }
+
+
+def _visibility_bit_q(lookup, name):
+    if name == "ADMIN":
+        return models.Q()
+    return models.Q(**{lookup + "__has": VISIBILITY[name]})
+
+
 class FeatureClassQuerySet(models.QuerySet):
     """
     QuerySet class for FeatureClass model
@@ -81,110 +277,164 @@ class FeatureClassQuerySet(models.QuerySet):
     def www(self):
         return self.filter(www=True)
 
+    def update(self, **kwargs):
+        feature_class_ids = None
+        if "open_data" in kwargs or "www" in kwargs:
+            feature_class_ids = list(self.values_list("pk", flat=True))
+        rows = super().update(**kwargs)
+        bump_model_version(self.model)
+        if feature_class_ids:
+            features = Feature.objects.filter(feature_class_id__in=feature_class_ids)
+            features.update_visibility()
+            features.update_observation_counts()
+        return rows
 
-class FeatureQuerySet(ProtectionLevelQuerySet):
+
+class FeatureQuerySet(VisibilityQuerySetMixin, ProtectionLevelQuerySet):
     """
     QuerySet class For Feature model
-    """
 
-    def for_office_hki(self):
-        links = FeatureLink.objects.filter(
-            protection_level__gte=PROTECTION_LEVELS["OFFICE"]
-        )
-        transactions = Transaction.objects.filter(
-            protection_level__gte=PROTECTION_LEVELS["OFFICE"]
-        )
-        prefetch_transactions = Prefetch("transactions", queryset=transactions)
-        prefetch_links = Prefetch("links", queryset=links)
-        return (
-            super()
-            .for_office_hki()
-            .prefetch_related(prefetch_transactions, prefetch_links)
-        )
+    Office users that do not work for City of Helsinki do not have access
+    to UHEX features
+    """
 
-    def for_office(self):
-        """For office users that do not work for City of Helsinki
+    def visibility_q(self, name):
+        if not _has_visibility(self.model):
+            return _feature_visibility_q(name)
+        return _visibility_bit_q("visibility", name)
 
-        These users do not have access to UHEX features
+    def with_visible_relations(self, protection_level=PROTECTION_LEVELS["PUBLIC"]):
+        """Prefetch the links and transactions visible at the given protection level
 
-        for_office() gets it's prefetch from for_office_hki()
+        The role methods only filter the features. Callers that render the
+        links or transactions of the features opt in to fetching them.
         """
-        feature_class_id = OFFICE_HKI_ONLY_FEATURE_CLASS_ID
-        return super().for_office().exclude(feature_class_id=feature_class_id)
-
-    def for_public(self):
+        links = FeatureLink.objects.filter(protection_level__gte=protection_level)
         transactions = Transaction.objects.filter(
-            protection_level__gte=PROTECTION_LEVELS["PUBLIC"]
-        )
-        links = FeatureLink.objects.filter(
-            protection_level__gte=PROTECTION_LEVELS["PUBLIC"]
+            protection_level__gte=protection_level
         )
         prefetch_transactions = Prefetch("transactions", queryset=transactions)
         prefetch_links = Prefetch("links", queryset=links)
-        return (
-            super().for_public().prefetch_related(prefetch_transactions, prefetch_links)
+        return self.prefetch_related(prefetch_transactions, prefetch_links)
+
+    def update_visibility(self):
+        """Recompute the visibility of the features from their current values"""
+        return self.update(visibility=feature_visibility_expression())
+
+    def update_observation_counts(self):
+        """Recompute the observation counts of the features and their species"""
+        feature_ids = list(self.values_list("pk", flat=True))
+        FeatureObservationCount.update_counts(feature_ids)
+        SpeciesObservationCount.update_counts(
+            Observation.objects.filter(feature_id__in=feature_ids)
+            .order_by()
+            .values_list("species_id", flat=True)
+            .distinct()
         )
 
-    def open_data(self):
-        return (
-            super()
-            .open_data()
-            .filter(feature_class__in=FeatureClass.objects.open_data())
+    def update(self, **kwargs):
+        if "geometry" in kwargs and _has_wgs84_geometry(self.model):
+            kwargs.setdefault("geometry_wgs84", to_wgs84(kwargs["geometry"]))
+        if _has_visibility(self.model) and any(
+            field in kwargs for field in FEATURE_VISIBILITY_FIELDS
+        ):
+            kwargs.setdefault("visibility", self._get_visibility_expression(kwargs))
+        rows = super().update(**kwargs)
+        bump_model_version(self.model)
+        return rows
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if "geometry" in fields and _has_wgs84_geometry(self.model):
+            objs = list(objs)
+            for obj in objs:
+                obj.update_wgs84_geometry()
+            fields = [*fields, "geometry_wgs84"]
+        if _has_visibility(self.model) and any(
+            field in fields for field in FEATURE_VISIBILITY_FIELDS
+        ):
+            objs = list(objs)
+            _update_visibilities(objs)
+            fields = [*fields, "visibility"]
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        if _has_wgs84_geometry(self.model):
+            objs = list(objs)
+            for obj in objs:
+                obj.update_wgs84_geometry()
+        if _has_visibility(self.model):
+            objs = list(objs)
+            _update_visibilities(objs)
+        objs = super().bulk_create(objs, *args, **kwargs)
+        bump_model_version(self.model)
+        return objs
+
+    def _get_visibility_expression(self, kwargs):
+        feature_class = kwargs.get("feature_class", kwargs.get("feature_class_id"))
+        if feature_class is not None and not isinstance(feature_class, FeatureClass):
+            feature_class = FeatureClass.objects.get(pk=feature_class)
+        return feature_visibility_expression(
+            kwargs.get("protection_level"), feature_class
         )
 
-    def www(self):
-        return super().www().filter(feature_class__in=FeatureClass.objects.www())
 
+def _has_wgs84_geometry(model):
+    return hasattr(model, "update_wgs84_geometry")
 
-class FeatureRelatedQuerySet(models.QuerySet):
-    """
-    QuerySet class for models that has a FK relationship to Feature model
-    but not protected by a protection_level field
-    """
 
-    def for_admin(self):
-        return self
+def _has_visibility(model):
+    return hasattr(model, "update_visibility")
 
-    def for_office_hki(self):
-        return self.filter(feature__in=Feature.objects.for_office_hki())
 
-    def for_office(self):
-        return self.filter(feature__in=Feature.objects.for_office())
+def _update_visibilities(features):
+    """Update the visibility of features reading their feature classes at once"""
+    feature_classes = get_feature_class_infos(
+        {feature.feature_class_id for feature in features}
+    )
+    for feature in features:
+        feature.update_visibility(feature_classes.get(feature.feature_class_id))
 
-    def for_public(self):
-        return self.filter(feature__in=Feature.objects.for_public())
 
-    def open_data(self):
-        return self.filter(feature__in=Feature.objects.open_data())
+def _feature_visibility_q(name):
+    """Return the filter of the features in a VISIBILITY data set
 
-    def www(self):
-        return self.filter(feature__in=Feature.objects.www())
+    Used for features without a stored visibility, e.g. historical features.
+    """
+    if name == "ADMIN":
+        return models.Q()
+    q = models.Q(protection_level__gte=VISIBILITY_PROTECTION_LEVELS[name])
+    if name == "OFFICE":
+        q &= ~models.Q(feature_class_id=OFFICE_HKI_ONLY_FEATURE_CLASS_ID)
+    elif name == "OPEN_DATA":
+        q &= models.Q(feature_class__open_data=True)
+    elif name == "WWW":
+        q &= models.Q(feature_class__www=True)
+    return q
+
+
+class FeatureRelatedQuerySet(VisibilityQuerySetMixin, models.QuerySet):
+    """
+    QuerySet class for models that has a FK relationship to Feature model
+    but not protected by a protection_level field
+    """
 
+    def visibility_q(self, name):
+        return _visibility_bit_q("feature__visibility", name)
 
-class FeatureRelatedProtectionLevelQuerySet(ProtectionLevelQuerySet):
+
+class FeatureRelatedProtectionLevelQuerySet(
+    VisibilityQuerySetMixin, ProtectionLevelQuerySet
+):
     """
     Queryset class for models that has a FK relationship to Feature model
     and has protection_level field
     """
 
-    def for_office_hki(self):
-        return (
-            super()
-            .for_office_hki()
-            .filter(feature__in=Feature.objects.for_office_hki())
-        )
-
-    def for_office(self):
-        return super().for_office().filter(feature__in=Feature.objects.for_office())
-
-    def for_public(self):
-        return super().for_public().filter(feature__in=Feature.objects.for_public())
-
-    def open_data(self):
-        return super().open_data().filter(feature__in=Feature.objects.open_data())
-
-    def www(self):
-        return super().www().filter(feature__in=Feature.objects.www())
+    def visibility_q(self, name):
+        q = _visibility_bit_q("feature__visibility", name)
+        if name != "ADMIN":
+            q &= models.Q(protection_level__gte=VISIBILITY_PROTECTION_LEVELS[name])
+        return q
 
 
 class ObservationQuerySet(FeatureRelatedProtectionLevelQuerySet):
@@ -193,24 +443,45 @@ class ObservationQuerySet(FeatureRelatedProtectionLevelQuerySet):
     protection level into account
     """
 
-    def for_office_hki(self):
-        return (
-            super()
-            .for_office_hki()
-            .filter(species__in=Species.objects.for_office_hki())
+    def visibility_q(self, name):
+        return super().visibility_q(name) & _visibility_bit_q(
+            "species__visibility", name
         )
 
-    def for_office(self):
-        return super().for_office().filter(species__in=Species.objects.for_office())
-
-    def for_public(self):
-        return super().for_public().filter(species__in=Species.objects.for_public())
 
-    def open_data(self):
-        return super().open_data().filter(species__in=Species.objects.open_data())
+class SpeciesQuerySet(ProtectionLevelQuerySet):
+    """
+    QuerySet class for Species model
+    """
 
-    def www(self):
-        return super().www().filter(species__in=Species.objects.www())
+    def update(self, **kwargs):
+        if "protection_level" in kwargs:
+            kwargs.setdefault(
+                "visibility", visibility_expression(kwargs["protection_level"])
+            )
+        rows = super().update(**kwargs)
+        bump_model_version(self.model)
+        return rows
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if "protection_level" in fields:
+            objs = list(objs)
+            for obj in objs:
+                obj.update_visibility()
+            fields = [*fields, "visibility"]
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.update_visibility()
+        objs = super().bulk_create(objs, *args, **kwargs)
+        bump_model_version(self.model)
+        return objs
+
+    def update_visibility(self):
+        """Recompute the visibility of the species from their protection levels"""
+        return self.update(visibility=visibility_expression(F("protection_level")))
 
 
 class ProtectionLevelMixin(models.Model):
@@ -240,6 +511,24 @@ class PermissiveGeometryField(models.GeometryField):
     """
 
 
+class VisibilityField(models.PositiveSmallIntegerField):
+    """
+    Bitmask of the VISIBILITY data sets an object belongs to. Supports the has
+    lookup, e.g. filter(visibility__has=VISIBILITY["PUBLIC"]).
+    """
+
+
+@VisibilityField.register_lookup
+class HasBits(models.Lookup):
+    lookup_name = "has"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        params = (*lhs_params, *rhs_params, *rhs_params)
+        return "({0} & {1}) = {1}".format(lhs, rhs), params
+
+
 class Origin(models.Model):
     explanation = models.CharField(
         _("explanation"), max_length=50, blank=True, null=True, db_column="selitys"
@@ -602,6 +891,18 @@ class Feature(AbstractFeature):
         related_name="features",
         verbose_name=_("publications"),
     )
+    # WGS84 copy of the geometry served by the REST API
+    geometry_wgs84 = PermissiveGeometryField(
+        db_column="geometry_wgs84",
+        srid=WGS84_SRID,
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name=_("geometry (WGS84)"),
+    )
+    visibility = VisibilityField(
+        _("visibility"), db_column="nakyvyys", default=0, editable=False
+    )
 
     class Meta:
         ordering = ["id"]
@@ -612,13 +913,77 @@ class Feature(AbstractFeature):
     def __str__(self):
         return self.name or "Feature {0}".format(self.id)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Observation counts are only updated when the visibility changes
+        instance._loaded_visibility = instance.__dict__.get("visibility")
+        return instance
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        self.update_wgs84_geometry()
+        self.update_visibility()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if "geometry" in update_fields:
+                update_fields.add("geometry_wgs84")
+            if update_fields.intersection(FEATURE_VISIBILITY_FIELDS):
+                update_fields.add("visibility")
+            kwargs["update_fields"] = update_fields
+        super().save(*args, **kwargs)
+        if not adding and self.visibility != getattr(self, "_loaded_visibility", None):
+            # The visibility of the observations has changed
+            FeatureObservationCount.update_counts([self.pk])
+            SpeciesObservationCount.update_counts(
+                self.observations.values_list("species_id", flat=True).distinct()
+            )
+        self._loaded_visibility = self.visibility
+
+    def update_wgs84_geometry(self):
+        self.geometry_wgs84 = to_wgs84(self.geometry)
+
+    def update_visibility(self, feature_class=None):
+        """Compute the visibility of the feature
+
+        The feature class is read from the database unless it is given, the
+        registry may be stale in processes that do not share the cache.
+
+        :param feature_class: FeatureClassInfo of the feature class
+        """
+        if feature_class is None:
+            feature_classes = get_feature_class_infos([self.feature_class_id])
+            feature_class = feature_classes.get(self.feature_class_id)
+        if feature_class is None:
+            feature_class = self.feature_class  # not saved yet
+        self.visibility = get_visibility(self.protection_level, feature_class)
+
+    def get_observation_counts(self):
+        """Return the numbers of observations by VISIBILITY names"""
+        return FeatureObservationCount.get_counts(self)
+
     @property
     def is_protected(self):
-        return self.feature_class.is_protected
+        super_class_id = self._get_feature_class_info().super_class_id
+        return super_class_id == FeatureClass.PROTECTED_SUPER_CLASS_ID
 
     @property
     def is_square(self):
-        return self.feature_class.is_square
+        super_class_id = self._get_feature_class_info().super_class_id
+        return super_class_id == FeatureClass.SQUARE_SUPER_CLASS_ID
+
+    def _get_feature_class_info(self):
+        """Return the feature class without fetching it for each feature
+
+        The feature class is looked up from the registry unless it has
+        already been fetched or it is not saved yet.
+        """
+        if not self._meta.get_field("feature_class").is_cached(self):
+            feature_class = feature_class_registry.get(self.feature_class_id)
+            if feature_class is not None:
+                return feature_class
+        return self.feature_class
 
 
 class HistoricalFeature(AbstractFeature):
@@ -838,6 +1203,37 @@ class Observation(ProtectionLevelMixin, models.Model):
     def __str__(self):
         return self.code or "Observation {0}".format(self.id)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._counted_in = _get_counted_in(instance)
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._update_observation_counts()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self._update_observation_counts()
+        return result
+
+    def _update_observation_counts(self):
+        # Update the counts of the previous feature and species too
+        feature_ids, species_ids = zip(
+            _get_counted_in(self), getattr(self, "_counted_in", (None, None))
+        )
+        FeatureObservationCount.update_counts(feature_ids)
+        SpeciesObservationCount.update_counts(species_ids)
+        self._counted_in = _get_counted_in(self)
+
+
+def _get_counted_in(observation):
+    return (
+        observation.__dict__.get("feature_id"),
+        observation.__dict__.get("species_id"),
+    )
+
 
 class Species(ProtectionLevelMixin, models.Model):
     taxon = models.CharField(
@@ -935,6 +1331,11 @@ class Species(ProtectionLevelMixin, models.Model):
         related_name="species",
         verbose_name=_("regulations"),
     )
+    visibility = VisibilityField(
+        _("visibility"), db_column="nakyvyys", default=0, editable=False
+    )
+
+    objects = SpeciesQuerySet.as_manager()
 
     class Meta:
         ordering = ["id"]
@@ -946,6 +1347,149 @@ class Species(ProtectionLevelMixin, models.Model):
         name_list = [self.name_fi, self.name_sci_1, self.name_subspecies_1]
         return ", ".join([name for name in name_list if name])
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Observation counts are only updated when the visibility changes
+        instance._loaded_visibility = instance.__dict__.get("visibility")
+        return instance
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        self.update_visibility()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "protection_level" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "visibility"}
+        super().save(*args, **kwargs)
+        if not adding and self.visibility != getattr(self, "_loaded_visibility", None):
+            # The visibility of the observations has changed
+            SpeciesObservationCount.update_counts([self.pk])
+            FeatureObservationCount.update_counts(
+                self.observations.values_list("feature_id", flat=True).distinct()
+            )
+        self._loaded_visibility = self.visibility
+
+    def update_visibility(self):
+        self.visibility = get_visibility(self.protection_level)
+
+    def get_observation_counts(self):
+        """Return the numbers of observations by VISIBILITY names"""
+        return SpeciesObservationCount.get_counts(self)
+
+
+class ObservationCount(models.Model):
+    """
+    Number of observations of an object in a VISIBILITY data set
+
+    The counts are updated when observations are saved, when the visibility
+    of features or species changes and when the open_data or www flags of
+    feature classes change. Other changes made with querysets or directly in
+    the database are counted by the rebuild_observation_counts management
+    command.
+    """
+
+    ROLE_CHOICES = [(name, name) for name in VISIBILITY]
+
+    # Observation field of the counted objects
+    counted_field = None
+
+    # Number of objects counted in one query
+    chunk_size = 1000
+
+    role = models.CharField(
+        _("role"), max_length=10, choices=ROLE_CHOICES, db_column="rooli"
+    )
+    count = models.PositiveIntegerField(_("count"), default=0, db_column="lkm")
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def update_counts(cls, ids):
+        """Recompute the counts of the objects with the given ids
+
+        :param ids: Ids of the counted objects, None values are ignored
+        """
+        ids = sorted({pk for pk in ids if pk is not None})
+        for start in range(0, len(ids), cls.chunk_size):
+            end = start + cls.chunk_size
+            cls._update_counts(ids[start:end])
+
+    @classmethod
+    def _update_counts(cls, ids):
+        qs = Observation.objects.filter(**{cls.counted_field + "__in": ids})
+        rows = (
+            qs.order_by()
+            .values(cls.counted_field)
+            .annotate(**qs.visibility_count_aggregates())
+        )
+        counts = {row.pop(cls.counted_field): row for row in rows}
+        cls.objects.bulk_create(
+            [
+                cls(
+                    **{cls.counted_field + "_id": pk},
+                    role=role,
+                    count=counts.get(pk, {}).get(role, 0),
+                )
+                for pk in ids
+                for role in VISIBILITY
+            ],
+            update_conflicts=True,
+            unique_fields=[cls.counted_field, "role"],
+            update_fields=["count"],
+        )
+
+    @classmethod
+    def get_counts(cls, obj):
+        """Return the counts of an object by VISIBILITY names
+
+        The counts are computed from the observations if they have not
+        been stored yet.
+        """
+        counts = {
+            counter.role: counter.count
+            for counter in cls.objects.filter(**{cls.counted_field: obj})
+        }
+        if len(counts) != len(VISIBILITY):
+            counts = obj.observations.visibility_counts()
+        return counts
+
+
+class FeatureObservationCount(ObservationCount):
+    counted_field = "feature"
+
+    feature = models.ForeignKey(
+        Feature,
+        models.CASCADE,
+        db_column="kohdeid",
+        related_name="observation_counts",
+        verbose_name=_("feature"),
+    )
+
+    class Meta:
+        db_table = "kohde_havaintomaara"
+        unique_together = ("feature", "role")
+        verbose_name = _("feature observation count")
+        verbose_name_plural = _("feature observation counts")
+
+
+class SpeciesObservationCount(ObservationCount):
+    counted_field = "species"
+
+    species = models.ForeignKey(
+        Species,
+        models.CASCADE,
+        db_column="lajid",
+        related_name="observation_counts",
+        verbose_name=_("species"),
+    )
+
+    class Meta:
+        db_table = "laji_havaintomaara"
+        unique_together = ("species", "role")
+        verbose_name = _("species observation count")
+        verbose_name_plural = _("species observation counts")
+
 
 class MigrationClass(models.Model):
     explanation = models.CharField(
@@ -1150,6 +1694,22 @@ class FeatureClass(models.Model):
     def __str__(self):
         return self.name or "Feature class {0}".format(self.id)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_flags = _get_visibility_flags(instance)
+        return instance
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        flags = _get_visibility_flags(self)
+        if not adding and flags != getattr(self, "_loaded_flags", None):
+            # open_data and www change the visibility of the features
+            self.features.update_visibility()
+            self.features.update_observation_counts()
+        self._loaded_flags = flags
+
     @property
     def is_protected(self):
         return self.super_class_id == self.PROTECTED_SUPER_CLASS_ID
@@ -1159,6 +1719,10 @@ class FeatureClass(models.Model):
         return self.super_class_id == self.SQUARE_SUPER_CLASS_ID
 
 
+def _get_visibility_flags(feature_class):
+    return feature_class.__dict__.get("open_data"), feature_class.__dict__.get("www")
+
+
 class BreedingDegree(models.Model):
     explanation = models.CharField(
         _("explanation"), max_length=50, blank=True, null=True, db_column="selitys"
@@ -0,0 +1,15 @@
+from rest_framework.pagination import CursorPagination
+
+
+class IdCursorPagination(CursorPagination):
+    """Keyset pagination ordered by the primary key
+
+    Intended for harvesters that walk through a whole endpoint. Unlike
+    the default page number pagination it does not count the rows of the
+    queryset and does not use OFFSET, so the cost of fetching a page does
+    not depend on how deep into the dataset the page is.
+    """
+
+    ordering = "id"
+    page_size_query_param = "page_size"
+    max_page_size = 5000
@@ -0,0 +1,165 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch, prefetch_related_objects
+from rest_framework import relations, serializers
+
+from nature.enums import UserRole
+
+# Queryset methods filtering the objects visible to each role, see
+# filter_visible. Requests without a role see open data.
+ROLE_QUERYSET_METHODS = {
+    UserRole.ADMIN: "for_admin",
+    UserRole.OFFICE_HKI: "for_office_hki",
+    UserRole.OFFICE: "for_office",
+    UserRole.PUBLIC: "www",
+    None: "open_data",
+}
+
+
+class QueryPlan:
+    """select_related and prefetch_related lookups required by a serializer"""
+
+    def __init__(self):
+        self.select_related = []
+        self.prefetch_related = []
+
+    def apply(self, queryset):
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        return queryset
+
+    def prefetch_objects(self, instances):
+        """Fetch the planned relations of already fetched objects at once
+
+        Relations that are already cached on the objects, e.g. because the
+        plan was applied to their queryset, are not fetched again.
+        """
+        lookups = [*self.select_related, *self.prefetch_related]
+        if instances and lookups:
+            prefetch_related_objects(instances, *lookups)
+
+
+def build_query_plan(serializer, role=None):
+    """Build the query plan for serializing instances with the given serializer
+
+    Nested serializers and related fields that need the related object are
+    joined with select_related when the relation is single valued. Many
+    relations, both nested list serializers and hyperlink lists, are
+    prefetched with querysets filtered to the objects visible to the role,
+    so that the prefetched objects can be serialized as they are.
+
+    :param serializer: The serializer instance, or the child of a list serializer
+    :param role: The UserRole of the request or None for open data
+    :return: The query plan
+    :rtype: QueryPlan
+    """
+    plan = QueryPlan()
+    _plan_fields(plan, serializer, serializer.Meta.model, prefix="", role=role)
+    return plan
+
+
+def get_serialized_models(serializer):
+    """Return the models whose data is included in the serializer output
+
+    :param serializer: The serializer instance, or the child of a list serializer
+    :return: The serialized model and the models of its serialized relations
+    :rtype: set
+    """
+    model = serializer.Meta.model
+    models = {model}
+    for field in serializer.fields.values():
+        if field.write_only or len(field.source_attrs) != 1:
+            continue
+
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            continue
+
+        if not model_field.is_relation:
+            continue
+
+        if isinstance(field, serializers.ListSerializer):
+            models |= get_serialized_models(field.child)
+        elif isinstance(field, serializers.BaseSerializer):
+            models |= get_serialized_models(field)
+        else:
+            models.add(model_field.related_model)
+        if model_field.many_to_many:
+            through = getattr(model_field, "through", None)
+            models.add(through or model_field.remote_field.through)
+    return models
+
+
+def get_visible_queryset(model, role=None):
+    """Return the queryset of the model objects visible in the API"""
+    return filter_visible(model._default_manager.all(), role)
+
+
+def filter_visible(qs, role=None):
+    """Filter the queryset to the objects visible to the role
+
+    Querysets without visibility filters are returned as they are, and
+    querysets that only know open data and www, like feature classes, are
+    not filtered for the office and admin roles.
+
+    :param qs: The queryset or related manager
+    :param role: The UserRole of the request or None for open data
+    """
+    method = getattr(qs, ROLE_QUERYSET_METHODS[role], None)
+    return method() if method is not None else qs
+
+
+def _plan_fields(plan, serializer, model, prefix, role):
+    for field in serializer.fields.values():
+        if field.write_only or len(field.source_attrs) != 1:
+            continue  # source="*" and dotted sources are not relations of the model
+
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            continue  # annotations, properties and methods
+
+        if not model_field.is_relation:
+            continue
+
+        lookup = prefix + field.source
+        related_model = model_field.related_model
+        if model_field.many_to_many or model_field.one_to_many:
+            plan.prefetch_related.append(
+                Prefetch(
+                    lookup, queryset=_get_prefetch_queryset(field, model_field, role)
+                )
+            )
+        elif isinstance(field, serializers.BaseSerializer):
+            plan.select_related.append(lookup)
+            _plan_fields(plan, field, related_model, prefix=lookup + "__", role=role)
+        elif not (model_field.concrete and _uses_pk_only(field)):
+            plan.select_related.append(lookup)
+
+
+def _get_prefetch_queryset(field, model_field, role):
+    related_model = model_field.related_model
+    qs = get_visible_queryset(related_model, role)
+
+    if isinstance(field, serializers.ListSerializer):
+        return build_query_plan(field.child, role).apply(qs)
+
+    if isinstance(field, relations.ManyRelatedField) and _uses_pk_only(
+        field.child_relation
+    ):
+        # Hyperlink lists only need the primary keys of the related objects
+        only_fields = [related_model._meta.pk.name]
+        if model_field.one_to_many:
+            only_fields.append(model_field.field.name)
+        return qs.prefetch_related(None).only(*only_fields)
+
+    return qs
+
+
+def _uses_pk_only(field):
+    """Return True if the related field only needs the primary key of the object"""
+    return (
+        isinstance(field, relations.RelatedField) and field.use_pk_only_optimization()
+    )
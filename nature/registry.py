@@ -0,0 +1,105 @@
+from collections import namedtuple
+
+from django.apps import apps
+
+from nature.caching import get_model_version_name, get_version
+
+FeatureClassInfo = namedtuple(
+    "FeatureClassInfo", ["id", "open_data", "www", "super_class_id"]
+)
+
+
+class FeatureClassRegistry:
+    """In-process registry of the feature classes and their visibility flags
+
+    The feature classes are loaded once per process and reloaded when the
+    FeatureClass version in nature.caching changes, i.e. when feature
+    classes are saved or deleted in any process sharing the cache. Only
+    used for displaying features, e.g. Feature.is_protected, the stored
+    visibility of features reads the feature classes from the database.
+    """
+
+    def __init__(self):
+        self._version = None
+        self._feature_classes = {}
+
+    def get(self, feature_class_id):
+        """Return the FeatureClassInfo of a feature class or None if it does not exist"""
+        return self._load().get(feature_class_id)
+
+    def clear(self):
+        self._version = None
+        self._feature_classes = {}
+
+    def _load(self):
+        model = apps.get_model("nature", "FeatureClass")
+        version = get_version(get_model_version_name(model))
+        if version != self._version:
+            rows = model.objects.values_list(*FeatureClassInfo._fields)
+            self._feature_classes = {row[0]: FeatureClassInfo(*row) for row in rows}
+            self._version = version
+        return self._feature_classes
+
+
+feature_class_registry = FeatureClassRegistry()
+
+
+def get_feature_class_infos(feature_class_ids):
+    """Return the FeatureClassInfo of the feature classes read from the database
+
+    Used instead of the registry when the visibility of features is stored,
+    since the registry of a process that does not share the cache with the
+    process changing the feature classes may be stale.
+
+    :return: The FeatureClassInfo by feature class id
+    :rtype: dict
+    """
+    model = apps.get_model("nature", "FeatureClass")
+    rows = model.objects.filter(pk__in=feature_class_ids).values_list(
+        *FeatureClassInfo._fields
+    )
+    return {row[0]: FeatureClassInfo(*row) for row in rows}
+
+
+class HMACGroupRegistry:
+    """In-process map of the HMAC group names to their permission levels
+
+    The groups are loaded once per process and reloaded when the HMACGroup
+    version in nature.caching changes, i.e. when groups are saved or
+    deleted in any process sharing the cache. With a local memory cache
+    the version expires after LOCAL_CACHE_VERSION_TIMEOUT seconds, so that
+    revoked groups lose their permissions in the other processes too.
+    """
+
+    def __init__(self):
+        self._version = None
+        self._permission_levels = {}
+
+    def get_permission_levels(self, names):
+        """Return the set of the permission levels of the groups with the given names"""
+        permission_levels = self._load()
+        return {
+            permission_level
+            for name in names
+            for permission_level in permission_levels.get(name, ())
+        }
+
+    def clear(self):
+        self._version = None
+        self._permission_levels = {}
+
+    def _load(self):
+        model = apps.get_model("hmac_auth", "HMACGroup")
+        version = get_version(get_model_version_name(model))
+        if version != self._version:
+            permission_levels = {}
+            for name, permission_level in model.objects.values_list(
+                "name", "permission_level"
+            ):
+                permission_levels.setdefault(name, set()).add(permission_level)
+            self._permission_levels = permission_levels
+            self._version = version
+        return self._permission_levels
+
+
+hmac_group_registry = HMACGroupRegistry()
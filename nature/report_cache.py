@@ -0,0 +1,77 @@
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.translation import get_language
+
+from nature.caching import get_model_versions
+from nature.models import Feature, FeatureClass, Species
+
+CACHE_KEY_PREFIX = "nature:report:"
+
+# Models deciding which objects the reports show, e.g. observations are
+# hidden by the protection levels of their features and species and the
+# www flags of the feature classes
+VISIBILITY_MODELS = (Feature, FeatureClass, Species)
+
+logger = logging.getLogger(__name__)
+
+
+class ReportCacheMixin:
+    """Report view mixin caching the rendered HTML of the reports
+
+    The cache key consists of the report template, the primary key of the
+    reported object, the role of the user, the language and the host of the
+    request and the versions of cache_models. The versions are the times of
+    the latest changes of the models, which are bumped by nature.signals
+    whenever objects of the models are saved or deleted, which invalidates
+    the cached reports. The VISIBILITY_MODELS are always included, since
+    the reports are filtered by them. cache_timeout limits how long reports
+    are kept; None uses REPORT_CACHE_TIMEOUT and 0 disables caching.
+    """
+
+    cache_models = ()
+    cache_timeout = None
+
+    def get(self, request, *args, **kwargs):
+        timeout = self.get_cache_timeout()
+        if not timeout:
+            return super().get(request, *args, **kwargs)
+
+        cache_key = self.get_cache_key()
+        content = cache.get(cache_key)
+        if content is not None:
+            return HttpResponse(content)
+
+        response = super().get(request, *args, **kwargs)
+        response.render()
+        if response.status_code == 200:
+            try:
+                cache.set(cache_key, response.content, timeout)
+            except Exception:
+                # e.g. the report exceeds the item size limit of memcached
+                logger.warning("Could not cache report", exc_info=True)
+        return response
+
+    def get_cache_timeout(self):
+        if self.cache_timeout is None:
+            return settings.REPORT_CACHE_TIMEOUT
+        return self.cache_timeout
+
+    def get_cache_models(self):
+        return dict.fromkeys((*VISIBILITY_MODELS, *self.cache_models))
+
+    def get_cache_key(self):
+        key_data = [
+            self.template_name,
+            self.kwargs.get(self.pk_url_kwarg),
+            self.get_user_role().name,
+            get_language(),
+            self.request.get_host(),
+            # Reports loading their observations separately or including them
+            getattr(self, "observation_pages_url_name", None),
+            *get_model_versions(self.get_cache_models()),
+        ]
+        return CACHE_KEY_PREFIX + hashlib.sha1(repr(key_data).encode()).hexdigest()
@@ -0,0 +1,150 @@
+import logging
+import shlex
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, HttpResponse
+from django.utils.translation import gettext as _
+
+# Cached in place of a PDF when the conversion fails
+RENDER_FAILED = b""
+
+# Seconds to cache RENDER_FAILED, after which the conversion is retried
+RENDER_FAILED_TIMEOUT = 60
+
+# Seconds a single conversion may take
+RENDER_TIMEOUT = 120
+
+logger = logging.getLogger(__name__)
+
+
+def render_pdf(html):
+    """Convert the HTML of a report to PDF with REPORT_PDF_COMMAND
+
+    The command reads the HTML from stdin and writes the PDF to stdout,
+    e.g. "wkhtmltopdf --quiet - -".
+
+    :param html: The rendered report
+    :type html: bytes
+    :return: The PDF document
+    :rtype: bytes
+    """
+    result = subprocess.run(
+        shlex.split(settings.REPORT_PDF_COMMAND),
+        input=html,
+        capture_output=True,
+        timeout=RENDER_TIMEOUT,
+        check=True,
+    )
+    return result.stdout
+
+
+class PDFRenderQueue:
+    """Background pool converting rendered reports to PDF documents
+
+    The documents are stored in the cache under the given cache keys. The
+    same report is converted only once at a time in a process. The pool is
+    created on first use, i.e. after the server has forked its workers.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def submit(self, cache_key, html):
+        with self._lock:
+            if cache_key in self._pending:
+                return
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=settings.REPORT_PDF_WORKERS,
+                    thread_name_prefix="report-pdf",
+                )
+            future = self._executor.submit(self._render, cache_key, html)
+            self._pending[cache_key] = future
+
+    def wait(self, timeout=None):
+        """Wait until the submitted reports have been converted"""
+        with self._lock:
+            futures = list(self._pending.values())
+        wait(futures, timeout=timeout)
+
+    def _render(self, cache_key, html):
+        try:
+            pdf = render_pdf(html)
+            cache.set(cache_key, pdf, settings.REPORT_PDF_CACHE_TIMEOUT)
+        except Exception:
+            # e.g. the conversion fails or the PDF exceeds the item size
+            # limit of memcached
+            logger.exception("Could not render report PDF")
+            cache.set(cache_key, RENDER_FAILED, RENDER_FAILED_TIMEOUT)
+        finally:
+            with self._lock:
+                del self._pending[cache_key]
+
+
+pdf_render_queue = PDFRenderQueue()
+
+
+class ReportPDFMixin:
+    """Report view mixin serving the reports as PDF documents with ?format=pdf
+
+    The PDF documents are converted from the rendered reports in the
+    background by pdf_render_queue and cached with the cache key of
+    ReportCacheMixin, i.e. per report, role and data version. Requests get a
+    202 response until the document is ready. The reports include all of
+    their observations in PDF documents.
+    """
+
+    pdf_query_param = "format"
+    # Whether the reports link to their PDF documents, not when they are
+    # published as static files
+    pdf_link = True
+
+    def get(self, request, *args, **kwargs):
+        if request.GET.get(self.pdf_query_param) != "pdf":
+            return super().get(request, *args, **kwargs)
+        if not settings.REPORT_PDF_COMMAND:
+            raise Http404
+
+        self.observation_pages_url_name = None
+        cache_key = self.get_cache_key() + ":pdf"
+        pdf = cache.get(cache_key)
+        if pdf == RENDER_FAILED:
+            return HttpResponse(
+                _("The PDF document could not be generated."),
+                content_type="text/plain; charset=utf-8",
+                status=503,
+            )
+        elif pdf is not None:
+            response = HttpResponse(pdf, content_type="application/pdf")
+            response["Content-Disposition"] = 'inline; filename="{0}-{1}.pdf"'.format(
+                request.resolver_match.url_name, self.kwargs.get(self.pk_url_kwarg)
+            )
+            return response
+
+        response = super().get(request, *args, **kwargs)
+        if response.status_code != 200:
+            return response
+        if hasattr(response, "render"):
+            response.render()
+        pdf_render_queue.submit(cache_key, response.content)
+
+        response = HttpResponse(
+            _("The PDF document is being generated."),
+            content_type="text/plain; charset=utf-8",
+            status=202,
+        )
+        response["Retry-After"] = "2"
+        response["Refresh"] = "2"
+        return response
+
+    def get_context_data(self, **kwargs):
+        context_data = super().get_context_data(**kwargs)
+        if self.pdf_link and settings.REPORT_PDF_COMMAND:
+            context_data["pdf_url"] = "?{0}=pdf".format(self.pdf_query_param)
+        return context_data
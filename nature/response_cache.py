@@ -0,0 +1,66 @@
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import urlencode
+from rest_framework.response import Response
+
+CACHE_KEY_PREFIX = "nature:api:"
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCacheMixin:
+    """Viewset mixin caching the serialized data of list and detail responses
+
+    The cache key consists of the absolute URL without the query string, the
+    query parameters sorted by name, the role key and the versions of the
+    models the response depends on (see ConditionalGetMixin). Saving or
+    deleting objects of those models changes their version, which
+    invalidates the cached responses. cache_timeout limits how long
+    responses are kept; None uses API_CACHE_TIMEOUT and 0 disables caching.
+    """
+
+    cache_timeout = None
+
+    def list(self, request, *args, **kwargs):
+        return self._get_cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._get_cached_response(super().retrieve, request, *args, **kwargs)
+
+    def get_cache_timeout(self):
+        if self.cache_timeout is None:
+            return settings.API_CACHE_TIMEOUT
+        return self.cache_timeout
+
+    def get_cache_key(self):
+        request = self.request
+        query_string = urlencode(sorted(request.GET.lists()), doseq=True)
+        key_data = [
+            request.build_absolute_uri(request.path),
+            query_string,
+            self.get_role_key(),
+            *self.get_dependency_versions(),
+        ]
+        return CACHE_KEY_PREFIX + hashlib.sha1(repr(key_data).encode()).hexdigest()
+
+    def _get_cached_response(self, view, request, *args, **kwargs):
+        timeout = self.get_cache_timeout()
+        if not timeout:
+            return view(request, *args, **kwargs)
+
+        cache_key = self.get_cache_key()
+        data = cache.get(cache_key)
+        if data is not None:
+            return Response(data)
+
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200:
+            try:
+                cache.set(cache_key, response.data, timeout)
+            except Exception:
+                # e.g. the response exceeds the item size limit of memcached
+                logger.warning("Could not cache response", exc_info=True)
+        return response
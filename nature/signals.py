@@ -0,0 +1,25 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from hmac_auth.models import HMACGroup
+from nature.caching import bump_model_version
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_model_cache(sender, **kwargs):
+    if sender._meta.app_label == "nature":
+        bump_model_version(sender)
+
+
+@receiver(m2m_changed)
+def invalidate_m2m_cache(sender, instance, action, model, **kwargs):
+    if sender._meta.app_label == "nature" and action.startswith("post_"):
+        bump_model_version(sender, type(instance), model)
+
+
+@receiver(post_save, sender=HMACGroup)
+@receiver(post_delete, sender=HMACGroup)
+def invalidate_hmac_groups(sender, **kwargs):
+    # Reloads the group permissions of nature.registry in all processes
+    bump_model_version(sender)
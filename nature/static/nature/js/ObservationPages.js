@@ -0,0 +1,36 @@
+(function() {
+    'use strict';
+
+    // Load the observation pages of the reports one after another and append
+    // them to the elements with the URL of the first page in data-url
+    function ObservationPages(container) {
+        this.container = container;
+        this.loadPage(container.getAttribute('data-url'));
+    }
+
+    ObservationPages.prototype.loadPage = function(url) {
+        var self = this;
+        var request = new XMLHttpRequest();
+        request.open('GET', url);
+        request.onload = function() {
+            if (request.status !== 200) {
+                return;
+            }
+            var page = JSON.parse(request.responseText);
+            self.container.insertAdjacentHTML('beforeend', page.html);
+            if (page.next) {
+                self.loadPage(page.next);
+            }
+        };
+        request.send();
+    };
+
+    document.addEventListener('DOMContentLoaded', function() {
+        var containers = document.querySelectorAll('.observation-pages');
+        Array.prototype.forEach.call(containers, function(container) {
+            new ObservationPages(container);
+        });
+    });
+
+    window.ObservationPages = ObservationPages;
+})();
@@ -0,0 +1,594 @@
+import json
+from unittest.mock import PropertyMock, patch
+
+from django.contrib.gis.geos import Point, Polygon
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.request import Request
+from rest_framework.reverse import reverse as api_reverse
+from rest_framework.test import APIRequestFactory
+
+from nature.api import FeatureSerializer
+from nature.enums import UserRole
+from nature.hyperlinks import cached_reverse
+from nature.models import PROTECTION_LEVELS, Feature
+from nature.tests.factories import (
+    AbundanceFactory,
+    BreedingDegreeFactory,
+    FeatureClassFactory,
+    FeatureFactory,
+    FeatureLinkFactory,
+    FeatureValueFactory,
+    FrequencyFactory,
+    HabitatTypeObservationFactory,
+    MigrationClassFactory,
+    ObservationFactory,
+    OccurrenceFactory,
+    OriginFactory,
+    ProtectionFactory,
+    SpeciesRegulationFactory,
+    SquareFactory,
+    TransactionFeatureFactory,
+)
+
+
+class TestCursorPagination(TestCase):
+    def setUp(self):
+        self.features = [FeatureFactory() for _ in range(3)]
+        self.feature_admin = FeatureFactory(protection_level=PROTECTION_LEVELS["ADMIN"])
+
+    def test_default_pagination_is_page_number(self):
+        response = self.client.get(reverse("feature-list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["count"], 3)
+
+    def test_feature_cursor_pagination(self):
+        url = reverse("feature-list")
+        response = self.client.get(url, {"pagination": "cursor", "page_size": 2})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertNotIn("count", data)
+        self.assertEqual(
+            [item["id"] for item in data["results"]],
+            [self.features[0].id, self.features[1].id],
+        )
+
+        response = self.client.get(data["next"])
+        data = response.json()
+        self.assertEqual(
+            [item["id"] for item in data["results"]], [self.features[2].id]
+        )
+        self.assertIsNone(data["next"])
+
+    def test_observation_cursor_pagination(self):
+        observation = ObservationFactory(feature=self.features[0])
+        ObservationFactory(
+            feature=self.features[0], protection_level=PROTECTION_LEVELS["ADMIN"]
+        )
+        url = reverse("observation-list")
+        response = self.client.get(url, {"pagination": "cursor"})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertNotIn("count", data)
+        self.assertEqual([item["id"] for item in data["results"]], [observation.id])
+
+    def test_cursor_page_size_is_capped(self):
+        url = reverse("feature-list")
+        response = self.client.get(url, {"pagination": "cursor", "page_size": 10**6})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["results"]), 3)
+
+
+class TestQueryPlanning(TestCase):
+    """API list endpoints run a constant number of queries per page"""
+
+    def assertConstantQueryCount(self, url_name, factory, num_queries):
+        """Assert that the list runs num_queries queries with one and many objects
+
+        The budget of a list page is one query for the ETag of the page, one
+        for the count, one for the page and one per prefetched relation.
+        """
+        url = reverse(url_name)
+        factory()
+        with self.assertNumQueries(num_queries):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        for _ in range(4):
+            factory()
+        with self.assertNumQueries(num_queries):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(response.json()["count"], 5)
+
+    def test_feature_list(self):
+        def create_feature():
+            feature = FeatureFactory()
+            ObservationFactory(feature=feature)
+            HabitatTypeObservationFactory(feature=feature)
+            FeatureValueFactory(feature=feature)
+            ProtectionFactory(id=feature)
+            SquareFactory(id=feature)
+
+        # values, publications, observations, habitat type observations,
+        # links, protection criteria and conservation programmes, transactions
+        self.assertConstantQueryCount("feature-list", create_feature, 11)
+
+    def test_observation_list(self):
+        def create_observation():
+            ObservationFactory(
+                abundance=AbundanceFactory(),
+                frequency=FrequencyFactory(),
+                migration_class=MigrationClassFactory(),
+                origin=OriginFactory(),
+                breeding_degree=BreedingDegreeFactory(),
+                occurrence=OccurrenceFactory(),
+            )
+
+        # The code lists are joined
+        self.assertConstantQueryCount("observation-list", create_observation, 3)
+
+    def test_feature_class_list(self):
+        def create_feature_class():
+            FeatureFactory.create_batch(2, feature_class=FeatureClassFactory())
+
+        self.assertConstantQueryCount("featureclass-list", create_feature_class, 4)
+
+    def test_species_list(self):
+        def create_species():
+            species_regulation = SpeciesRegulationFactory()
+            ObservationFactory(species=species_regulation.species)
+
+        # regulations and observations
+        self.assertConstantQueryCount("species-list", create_species, 5)
+
+    def test_transaction_list(self):
+        # transactions of the transaction type, features and regulations
+        self.assertConstantQueryCount(
+            "transaction-list", lambda: TransactionFeatureFactory(), 6
+        )
+
+    def test_feature_link_list(self):
+        self.assertConstantQueryCount("featurelink-list", FeatureLinkFactory, 3)
+
+    def test_habitat_type_observation_list(self):
+        self.assertConstantQueryCount(
+            "habitattypeobservation-list", HabitatTypeObservationFactory, 3
+        )
+
+    def test_prefetched_relations_are_filtered(self):
+        feature = FeatureFactory()
+        observation = ObservationFactory(feature=feature)
+        ObservationFactory(feature=feature, protection_level=PROTECTION_LEVELS["ADMIN"])
+        url = reverse("feature-detail", kwargs={"pk": feature.pk})
+        response = self.client.get(url)
+        observation_url = reverse("observation-detail", kwargs={"pk": observation.pk})
+        self.assertEqual(
+            response.json()["observations"],
+            ["http://testserver{0}".format(observation_url)],
+        )
+
+    def test_list_serializer_fetches_relations_per_list(self):
+        request = Request(APIRequestFactory().get("/"))
+
+        def serialize_features():
+            with CaptureQueriesContext(connection) as queries:
+                data = FeatureSerializer(
+                    Feature.objects.all(), many=True, context={"request": request}
+                ).data
+            return data, len(queries)
+
+        feature = FeatureFactory()
+        ObservationFactory(feature=feature)
+        ObservationFactory(feature=feature, protection_level=PROTECTION_LEVELS["ADMIN"])
+        data, single_feature_queries = serialize_features()
+        self.assertEqual(len(data[0]["observations"]), 1)
+
+        for _ in range(4):
+            ObservationFactory(feature=FeatureFactory())
+        data, many_features_queries = serialize_features()
+        self.assertEqual(len(data), 5)
+        self.assertEqual(many_features_queries, single_feature_queries)
+
+
+class TestCachedReverse(TestCase):
+    def test_same_urls_as_reverse(self):
+        request = Request(APIRequestFactory().get("/"))
+        for pk in (1, 123, "UHEX", "a-b_c", "a b", "ä", "a~b"):
+            for format in (None, "json"):
+                kwargs = {"pk": pk}
+                self.assertEqual(
+                    cached_reverse(
+                        "featureclass-detail",
+                        kwargs=kwargs,
+                        request=request,
+                        format=format,
+                    ),
+                    api_reverse(
+                        "featureclass-detail",
+                        kwargs=kwargs,
+                        request=request,
+                        format=format,
+                    ),
+                )
+
+    def test_serialized_urls(self):
+        feature = FeatureFactory()
+        response = self.client.get(reverse("feature-detail", kwargs={"pk": feature.pk}))
+        data = response.json()
+        self.assertEqual(
+            data["url"],
+            "http://testserver" + reverse("feature-detail", kwargs={"pk": feature.pk}),
+        )
+        self.assertEqual(
+            data["feature_class"],
+            "http://testserver"
+            + reverse("featureclass-detail", kwargs={"pk": feature.feature_class_id}),
+        )
+
+
+class TestSpatialFilter(TestCase):
+    def setUp(self):
+        self.url = reverse("feature-list")
+        # Features in Helsinki, in ETRS-GK25
+        self.feature_point = FeatureFactory(geometry=Point(25496000, 6673000))
+        self.feature_polygon = FeatureFactory(
+            geometry=Polygon.from_bbox((25500000, 6680000, 25501000, 6681000))
+        )
+
+    def get_ids(self, params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return {item["id"] for item in response.json()["results"]}
+
+    def test_bbox(self):
+        ids = self.get_ids({"bbox": "24.9,60.1,25.0,60.2"})
+        self.assertEqual(ids, {self.feature_point.id})
+
+        ids = self.get_ids({"bbox": "25495000,6672000,25500500,6680500", "srid": 3879})
+        self.assertEqual(ids, {self.feature_point.id, self.feature_polygon.id})
+
+    def test_intersects(self):
+        ids = self.get_ids(
+            {
+                "intersects": "LINESTRING(25500500 6679000, 25500500 6682000)",
+                "srid": 3879,
+            }
+        )
+        self.assertEqual(ids, {self.feature_polygon.id})
+
+        geojson = '{"type": "Point", "coordinates": [24.927945, 60.169862]}'
+        ids = self.get_ids({"dwithin": geojson, "distance": 1})
+        self.assertEqual(ids, {self.feature_point.id})
+
+    def test_dwithin(self):
+        params = {"dwithin": "POINT(25496000 6673100)", "srid": 3879}
+        ids = self.get_ids({**params, "distance": 50})
+        self.assertEqual(ids, set())
+
+        ids = self.get_ids({**params, "distance": 150})
+        self.assertEqual(ids, {self.feature_point.id})
+
+    def test_contains_point(self):
+        ids = self.get_ids({"contains_point": "25500500,6680500", "srid": 3879})
+        self.assertEqual(ids, {self.feature_polygon.id})
+
+    def test_open_data_only(self):
+        FeatureFactory(
+            geometry=Point(25496000, 6673000),
+            protection_level=PROTECTION_LEVELS["ADMIN"],
+        )
+        ids = self.get_ids(
+            {"dwithin": "POINT(25496000 6673000)", "distance": 1, "srid": 3879}
+        )
+        self.assertEqual(ids, {self.feature_point.id})
+
+    def test_invalid_parameters(self):
+        for params in [
+            {"bbox": "1,2,3"},
+            {"intersects": "not a geometry"},
+            {"dwithin": "POINT(1 1)"},
+            {"dwithin": "POINT(1 1)", "distance": "-1"},
+            {"contains_point": "a,b"},
+            {"bbox": "24.9,60.1,25.0,60.2", "srid": 3067},
+        ]:
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400, params)
+
+
+class TestGeometryOutput(TestCase):
+    def setUp(self):
+        # A circle with 257 vertices in Helsinki, in ETRS-GK25
+        self.feature = FeatureFactory(
+            geometry=Point(25496000, 6673000).buffer(1000, quadsegs=64)
+        )
+        self.url = reverse("feature-detail", kwargs={"pk": self.feature.pk})
+
+    def get_coordinates(self, params=None):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()["geometry"]["coordinates"][0]
+
+    def test_full_resolution_by_default(self):
+        self.assertEqual(len(self.get_coordinates()), 257)
+
+    def test_simplify(self):
+        coordinates = self.get_coordinates({"simplify": 100})
+        self.assertLess(len(coordinates), 257)
+        self.assertGreaterEqual(len(coordinates), 4)
+
+    @override_settings(API_MAX_GEOMETRY_VERTICES=50)
+    def test_vertex_cap(self):
+        self.assertLessEqual(len(self.get_coordinates()), 50)
+
+    def test_precision(self):
+        for x, y in self.get_coordinates({"precision": 3}):
+            self.assertEqual(round(x, 3), x)
+            self.assertEqual(round(y, 3), y)
+
+    def test_invalid_parameters(self):
+        for params in [{"simplify": "-1"}, {"simplify": "a"}, {"precision": "16"}]:
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400, params)
+
+
+class TestGeoJSONExport(TestCase):
+    def setUp(self):
+        self.feature = FeatureFactory(
+            geometry=Point(25496000, 6673000), text="text", text_www="www text"
+        )
+        FeatureFactory(protection_level=PROTECTION_LEVELS["ADMIN"])
+
+    def get_feature_collection(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/geo+json")
+        data = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(data["type"], "FeatureCollection")
+        return data["features"]
+
+    def test_feature_export(self):
+        url = reverse("feature-export", kwargs={"format": "geojson"})
+        features = self.get_feature_collection(url)
+        self.assertEqual(len(features), 1)
+        self.assertEqual(features[0]["id"], self.feature.id)
+        self.assertEqual(features[0]["geometry"]["type"], "Point")
+        self.assertAlmostEqual(features[0]["geometry"]["coordinates"][0], 24.928, 3)
+        self.assertEqual(features[0]["properties"]["text"], "www text")
+        self.assertNotIn("text_www", features[0]["properties"])
+
+    def test_feature_export_is_filtered(self):
+        url = reverse("feature-export", kwargs={"format": "geojson"})
+        features = self.get_feature_collection(url + "?bbox=0,0,1,1")
+        self.assertEqual(features, [])
+
+    def test_observation_export(self):
+        observation = ObservationFactory(feature=self.feature)
+        ObservationFactory(
+            feature=self.feature, protection_level=PROTECTION_LEVELS["ADMIN"]
+        )
+        url = reverse("observation-export", kwargs={"format": "geojson"})
+        features = self.get_feature_collection(url)
+        self.assertEqual([feature["id"] for feature in features], [observation.id])
+        self.assertEqual(features[0]["properties"]["feature"], self.feature.id)
+        self.assertEqual(features[0]["geometry"]["type"], "Point")
+
+
+class TestConditionalGet(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.feature = FeatureFactory()
+        self.list_url = reverse("feature-list")
+        self.detail_url = reverse("feature-detail", kwargs={"pk": self.feature.pk})
+
+    def assertNotModified(self, url, **headers):
+        response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def assertModified(self, url, **headers):
+        response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_etag(self):
+        for url in [self.list_url, self.detail_url]:
+            etag = self.assertModified(url)["ETag"]
+            self.assertNotModified(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_etag_depends_on_query_string(self):
+        etag = self.assertModified(self.list_url)["ETag"]
+        self.assertModified(self.list_url + "?page=1", HTTP_IF_NONE_MATCH=etag)
+
+    def test_etag_changes_when_object_changes(self):
+        etag = self.assertModified(self.detail_url)["ETag"]
+        self.feature.name = "changed"
+        self.feature.save()
+        response = self.assertModified(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()["name"], "changed")
+
+    def test_etag_changes_when_related_object_changes(self):
+        etag = self.assertModified(self.detail_url)["ETag"]
+        ObservationFactory(feature=self.feature)
+        self.assertModified(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_etag_changes_when_object_is_deleted(self):
+        feature = FeatureFactory()
+        etag = self.assertModified(self.list_url)["ETag"]
+        feature.delete()
+        self.assertModified(self.list_url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_last_modified(self):
+        last_modified = self.assertModified(self.list_url)["Last-Modified"]
+        self.assertNotModified(self.list_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+    def test_not_modified_skips_serialization(self):
+        etag = self.assertModified(self.list_url)["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertNotModified(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(len(queries), 1)
+
+    def test_validators_of_list_pages(self):
+        FeatureFactory.create_batch(10)
+        url = self.list_url + "?page=2"
+        etag = self.assertModified(url)["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertNotModified(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(len(queries), 1)
+        self.assertIn("LIMIT 10 OFFSET 10", queries[0]["sql"])
+
+    def test_validators_of_cursor_pages(self):
+        url = self.list_url + "?pagination=cursor"
+        etag = self.assertModified(url)["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertNotModified(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertFalse(any("COUNT(" in query["sql"] for query in queries))
+
+        FeatureFactory()
+        self.assertModified(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_models_without_last_modified_time(self):
+        url = reverse("featureclass-list")
+        etag = self.assertModified(url)["ETag"]
+        self.assertNotModified(url, HTTP_IF_NONE_MATCH=etag)
+        FeatureClassFactory()
+        self.assertModified(url, HTTP_IF_NONE_MATCH=etag)
+
+
+class TestResponseCache(TestCase):
+    def setUp(self):
+        self.feature = FeatureFactory()
+        self.url = reverse("feature-detail", kwargs={"pk": self.feature.pk})
+
+    def get_query_count(self, url, **extra):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, **extra)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_response_is_cached(self):
+        uncached_count = self.get_query_count(self.url)
+        cached_count = self.get_query_count(self.url)
+        # Only the validators of the conditional request are queried
+        self.assertEqual(cached_count, 1)
+        self.assertLess(cached_count, uncached_count)
+
+    def test_cache_key_normalizes_query_string(self):
+        url = reverse("feature-list")
+        self.get_query_count(url + "?page=1&precision=3")
+        self.assertEqual(self.get_query_count(url + "?precision=3&page=1"), 1)
+        self.assertGreater(self.get_query_count(url + "?precision=4&page=1"), 1)
+
+    @override_settings(ALLOWED_HOSTS=["testserver", "example.com"])
+    def test_cache_key_includes_host(self):
+        self.get_query_count(self.url)
+        response = self.client.get(self.url, HTTP_HOST="example.com")
+        self.assertTrue(response.json()["url"].startswith("http://example.com/"))
+
+    def test_cache_is_invalidated_by_related_changes(self):
+        self.client.get(self.url)
+        observation = ObservationFactory(feature=self.feature)
+        response = self.client.get(self.url)
+        observation_url = reverse("observation-detail", kwargs={"pk": observation.pk})
+        self.assertEqual(
+            response.json()["observations"],
+            ["http://testserver{0}".format(observation_url)],
+        )
+
+    @override_settings(API_CACHE_TIMEOUT=0)
+    def test_cache_can_be_disabled(self):
+        uncached_count = self.get_query_count(self.url)
+        self.assertEqual(self.get_query_count(self.url), uncached_count)
+
+
+class TestSparseFieldsets(TestCase):
+    def setUp(self):
+        self.feature = FeatureFactory()
+        ObservationFactory(feature=self.feature)
+        self.url = reverse("feature-list")
+
+    def get_results(self, params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()["results"]
+
+    def test_fields(self):
+        results = self.get_results({"fields": "id,name,feature_class,geometry"})
+        self.assertEqual(
+            list(results[0].keys()), ["id", "name", "feature_class", "geometry"]
+        )
+
+    def test_omit(self):
+        results = self.get_results({"omit": "observations,links"})
+        self.assertNotIn("observations", results[0])
+        self.assertNotIn("links", results[0])
+        self.assertIn("transactions", results[0])
+
+    def test_nested_serializers_are_not_limited(self):
+        results = self.get_results({"fields": "id,links"})
+        self.assertIn("url", results[0]["links"][0])
+
+    def test_unknown_fields(self):
+        for param in ["fields", "omit"]:
+            response = self.client.get(self.url, {param: "id,unknown"})
+            self.assertEqual(response.status_code, 400)
+
+    def test_omitted_relations_are_not_fetched(self):
+        with CaptureQueriesContext(connection) as all_fields:
+            self.client.get(self.url)
+        with CaptureQueriesContext(connection) as sparse_fields:
+            self.client.get(self.url, {"fields": "id,name,feature_class"})
+        # One query for the validators, one for the count and one for the page
+        self.assertEqual(len(sparse_fields), 3)
+        self.assertLess(len(sparse_fields), len(all_fields))
+        self.assertNotIn("geometry", sparse_fields[-1]["sql"])
+
+
+class TestRoleAwareQuerysets(TestCase):
+    def setUp(self):
+        self.feature = FeatureFactory()
+        self.feature_admin = FeatureFactory(protection_level=PROTECTION_LEVELS["ADMIN"])
+        self.url = reverse("feature-list")
+
+    def get_ids(self, **extra):
+        response = self.client.get(self.url, **extra)
+        self.assertEqual(response.status_code, 200)
+        return {item["id"] for item in response.json()["results"]}
+
+    @patch("nature.hmac.HMACAuth.user_role", new_callable=PropertyMock)
+    def test_hmac_role(self, user_role):
+        user_role.return_value = UserRole.ADMIN
+        self.assertEqual(self.get_ids(), {self.feature.id})
+        self.assertEqual(
+            self.get_ids(HTTP_AUTHORIZATION="hmac test"),
+            {self.feature.id, self.feature_admin.id},
+        )
+
+        user_role.return_value = UserRole.PUBLIC
+        self.assertEqual(
+            self.get_ids(HTTP_AUTHORIZATION="hmac test"), {self.feature.id}
+        )
+
+    def test_invalid_hmac_header(self):
+        response = self.client.get(self.url, HTTP_AUTHORIZATION="hmac test")
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response["WWW-Authenticate"], "hmac")
+
+        # Signed but not valid, e.g. expired
+        response = self.client.get(
+            self.url,
+            HTTP_DATE="Thu, 22 Jun 2017 17:15:21 GMT",
+            HTTP_PROXY_AUTHORIZATION=(
+                'hmac username="ltj", algorithm="hmac-sha256", '
+                'headers="date", signature="invalid"'
+            ),
+        )
+        self.assertEqual(response.status_code, 401)
+
+    def test_vary_on_role_headers(self):
+        response = self.client.get(self.url)
+        self.assertIn("X-Forwarded-Groups", response["Vary"])
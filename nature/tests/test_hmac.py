@@ -1,11 +1,17 @@
+from unittest.mock import Mock, patch
+
 from django.core.exceptions import PermissionDenied
 from django.test import TestCase, RequestFactory, override_settings
 from freezegun import freeze_time
 
 from hmac_auth.models import HMACGroup
 from hmac_auth.tests.factories import HMACGroupFactory
+from nature.auth_events import AuthFailureReporter, auth_failure_reporter
+from nature.checks import check_shared_cache
 from nature.enums import UserRole
 from nature.hmac import HMACAuth
+from nature.middleware import HMACAuthMiddleware
+from nature.registry import hmac_group_registry
 
 
 @override_settings(SHARED_SECRET="secret")
@@ -227,3 +233,195 @@ class TestHMACAuth(TestCase):
         )
         hmac_auth = HMACAuth(request)
         self.assertEqual(hmac_auth.user_role, UserRole.PUBLIC)
+
+    def _get_group_request(self, groups):
+        return self.factory.get(
+            "/test-url/",
+            HTTP_DATE="Thu, 22 Jun 2017 17:15:21 GMT",
+            HTTP_HOST="hmac.com",
+            HTTP_REQUEST_LINE="GET /requests HTTP/1.1",
+            HTTP_PROXY_AUTHORIZATION=(
+                "hmac "
+                'username="alice123", '
+                'algorithm="hmac-sha256", '
+                'headers="date request-line", '
+                'signature="ujWCGHeec9Xd6UD2zlyxiNMCiXnDOWeVFMu5VeRUxtw="'
+            ),
+            HTTP_X_FORWARDED_GROUPS=groups,
+        )
+
+    @freeze_time("2017-06-22 17:16:00")
+    def test_user_role_is_resolved_without_queries(self):
+        HMACAuth(self._get_group_request("ltj_virka")).user_role
+
+        request = self._get_group_request("ltj_virka;unknown")
+        with self.assertNumQueries(0):
+            self.assertEqual(HMACAuth(request).user_role, UserRole.OFFICE)
+            # The role is stored on the request
+            self.assertIs(request._hmac_user_role, UserRole.OFFICE)
+            self.assertEqual(HMACAuth(request).user_role, UserRole.OFFICE)
+
+    @freeze_time("2017-06-22 17:16:00")
+    def test_user_role_follows_group_changes(self):
+        request = self._get_group_request("ltj_virka")
+        self.assertEqual(HMACAuth(request).user_role, UserRole.OFFICE)
+
+        group = HMACGroup.objects.get(name="ltj_virka")
+        group.permission_level = HMACGroup.ADMIN
+        group.save()
+        request = self._get_group_request("ltj_virka")
+        self.assertEqual(HMACAuth(request).user_role, UserRole.ADMIN)
+
+        group.delete()
+        request = self._get_group_request("ltj_virka")
+        self.assertEqual(HMACAuth(request).user_role, UserRole.PUBLIC)
+
+
+@override_settings(SHARED_SECRET="secret")
+class TestHMACAuthMiddleware(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = HMACAuthMiddleware(lambda request: request)
+        HMACGroupFactory(name="ltj_virka", permission_level=HMACGroup.OFFICE)
+
+    def _get_request(self, signature):
+        return self.factory.get(
+            "/test-url/",
+            HTTP_DATE="Thu, 22 Jun 2017 17:15:21 GMT",
+            HTTP_REQUEST_LINE="GET /requests HTTP/1.1",
+            HTTP_PROXY_AUTHORIZATION=(
+                "hmac "
+                'username="alice123", '
+                'algorithm="hmac-sha256", '
+                'headers="date request-line", '
+                'signature="{0}"'.format(signature)
+            ),
+            HTTP_X_FORWARDED_GROUPS="ltj_virka",
+        )
+
+    @freeze_time("2017-06-22 17:16:00")
+    def test_user_role_of_valid_request(self):
+        request = self._get_request("ujWCGHeec9Xd6UD2zlyxiNMCiXnDOWeVFMu5VeRUxtw=")
+        self.assertEqual(self.middleware(request).user_role, UserRole.OFFICE)
+
+    def test_user_role_of_request_without_hmac_header(self):
+        request = self.factory.get("/test-url/", HTTP_AUTHORIZATION="Bearer token")
+        self.assertIsNone(self.middleware(request).user_role)
+        self.assertEqual(auth_failure_reporter.stats()["reported"], 0)
+
+    @freeze_time("2017-06-22 17:16:00")
+    def test_invalid_request_is_reported_once(self):
+        request = self._get_request("invalid")
+        self.assertIsNone(self.middleware(request).user_role)
+        with self.assertRaises(PermissionDenied):
+            HMACAuth(request).user_role
+        self.assertEqual(auth_failure_reporter.stats()["reported"], 1)
+
+
+@override_settings(LOCAL_CACHE_VERSION_TIMEOUT=60)
+class TestHMACGroupRegistry(TestCase):
+    @freeze_time("2024-01-01 12:00:00")
+    def test_reload_without_shared_cache(self):
+        HMACGroupFactory(name="ltj_virka", permission_level=HMACGroup.ADMIN)
+        levels = hmac_group_registry.get_permission_levels(["ltj_virka"])
+        self.assertEqual(levels, {HMACGroup.ADMIN})
+
+        # Downgraded in another process that does not share the cache
+        HMACGroup.objects.update(permission_level=HMACGroup.OFFICE)
+        levels = hmac_group_registry.get_permission_levels(["ltj_virka"])
+        self.assertEqual(levels, {HMACGroup.ADMIN})
+
+        with freeze_time("2024-01-01 12:01:01"):
+            levels = hmac_group_registry.get_permission_levels(["ltj_virka"])
+        self.assertEqual(levels, {HMACGroup.OFFICE})
+
+    @override_settings(DEBUG=False)
+    def test_local_memory_cache_is_checked(self):
+        self.assertEqual(
+            [warning.id for warning in check_shared_cache(None)], ["nature.W001"]
+        )
+
+        with override_settings(
+            CACHES={
+                "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+            }
+        ):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+@override_settings(HMAC_FAILURE_BUFFER_SIZE=2, HMAC_FAILURE_EVENTS_PER_FLUSH=2)
+class TestAuthFailureReporter(TestCase):
+    def setUp(self):
+        self.reporter = AuthFailureReporter()
+        # Flushed by the tests instead of the background thread
+        self.reporter._thread = Mock()
+
+    def _get_event(self, path, ip_address="127.0.0.1"):
+        return {
+            "type": "invalid-auth",
+            "headers": {},
+            "path": path,
+            "ip-address": ip_address,
+            "message": "Authorization failed",
+        }
+
+    @patch("nature.auth_events.capture_event")
+    def test_failures_are_merged(self, capture_event):
+        for i in range(3):
+            self.reporter.report(self._get_event("/a/"))
+        self.reporter.report(self._get_event("/a/", ip_address="127.0.0.2"))
+
+        self.assertEqual(self.reporter.flush(), 2)
+        events = [call.args[0] for call in capture_event.call_args_list]
+        self.assertEqual([event["count"] for event in events], [3, 1])
+        self.assertEqual(
+            self.reporter.stats(),
+            {
+                "reported": 4,
+                "merged": 2,
+                "dropped": 0,
+                "sent": 2,
+                "failed": 0,
+                "buffered": 0,
+            },
+        )
+
+    @patch("nature.auth_events.capture_event")
+    def test_query_string_is_not_part_of_the_key(self, capture_event):
+        factory = RequestFactory()
+        for query in ("?a=1", "?a=2", "?b=1"):
+            request = factory.get("/test-url/" + query)
+            event = HMACAuth(request)._get_event("no-auth", "Authorization failed")
+            self.reporter.report(event)
+
+        self.assertEqual(self.reporter.stats()["merged"], 2)
+        self.reporter.flush()
+        event = capture_event.call_args.args[0]
+        self.assertEqual(event["count"], 3)
+        self.assertEqual(event["full-path"], "/test-url/?a=1")
+
+    @patch("nature.auth_events.capture_event")
+    def test_buffer_is_bounded(self, capture_event):
+        for path in ("/a/", "/b/", "/c/", "/a/"):
+            self.reporter.report(self._get_event(path))
+        stats = self.reporter.stats()
+        self.assertEqual(stats["dropped"], 1)
+        self.assertEqual(stats["buffered"], 2)
+
+    @override_settings(HMAC_FAILURE_EVENTS_PER_FLUSH=1)
+    @patch("nature.auth_events.capture_event")
+    def test_flush_rate_is_capped(self, capture_event):
+        self.reporter.report(self._get_event("/a/"))
+        self.reporter.report(self._get_event("/b/"))
+
+        self.assertEqual(self.reporter.flush(), 1)
+        self.assertEqual(capture_event.call_args.args[0]["path"], "/a/")
+        self.assertEqual(self.reporter.flush(), 1)
+        self.assertEqual(capture_event.call_args.args[0]["path"], "/b/")
+        self.assertEqual(self.reporter.flush(), 0)
+
+    @patch("nature.auth_events.capture_event", side_effect=Exception)
+    def test_send_failures_are_counted(self, capture_event):
+        self.reporter.report(self._get_event("/a/"))
+        self.assertEqual(self.reporter.flush(), 0)
+        self.assertEqual(self.reporter.stats()["failed"], 1)
@@ -1,5 +1,6 @@
 from unittest.mock import patch, MagicMock
 
+from django.db.models import QuerySet
 from django.test import TestCase
 from django.contrib.gis.geos import Point, Polygon
 from django.utils.translation import activate
@@ -39,11 +40,17 @@ from .factories import (
 from ..models import (
     Feature,
     FeatureClass,
+    FeatureLink,
+    FeatureObservationCount,
+    HistoricalFeature,
     PROTECTION_LEVELS,
     OFFICE_HKI_ONLY_FEATURE_CLASS_ID,
     Observation,
     FeatureValue,
+    Species,
+    VISIBILITY,
 )
+from ..registry import feature_class_registry
 
 
 class TestFeatureClassQuerySet(TestCase):
@@ -171,6 +178,58 @@ class TestFeatureQuerySet(TestCase):
         ]
         self.assertQuerySetEqual(qs, expected_queryset, ordered=False)
 
+    def test_role_querysets_do_not_prefetch(self):
+        querysets = [
+            Feature.objects.for_office_hki(),
+            Feature.objects.for_office(),
+            Feature.objects.for_public(),
+            Feature.objects.open_data(),
+            Feature.objects.www(),
+        ]
+        for qs in querysets:
+            self.assertEqual(qs._prefetch_related_lookups, ())
+
+        with self.assertNumQueries(1):
+            Feature.objects.for_public().count()
+        with self.assertNumQueries(1):
+            list(FeatureLink.objects.filter(feature__in=Feature.objects.for_public()))
+
+    def test_with_visible_relations(self):
+        link = FeatureLinkFactory(feature=self.feature_public)
+        FeatureLinkFactory(
+            feature=self.feature_public, protection_level=PROTECTION_LEVELS["ADMIN"]
+        )
+        feature = (
+            Feature.objects.for_public()
+            .with_visible_relations(PROTECTION_LEVELS["PUBLIC"])
+            .get(pk=self.feature_public.pk)
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(list(feature.links.all()), [link])
+            self.assertEqual(list(feature.transactions.all()), [])
+
+    def test_update_protection_level(self):
+        Feature.objects.filter(id=self.feature_admin.id).update(
+            protection_level=PROTECTION_LEVELS["PUBLIC"]
+        )
+        self.assertIn(self.feature_admin, Feature.objects.for_public())
+        self.assertNotIn(self.feature_admin, Feature.objects.open_data())
+
+    def test_update_feature_class(self):
+        Feature.objects.filter(id=self.feature_public.id).update(
+            feature_class=self.feature_public_open_data.feature_class
+        )
+        self.assertIn(self.feature_public, Feature.objects.open_data())
+
+    def test_feature_class_change(self):
+        feature_class = self.feature_public.feature_class
+        feature_class.open_data = True
+        feature_class.save()
+        self.assertIn(self.feature_public, Feature.objects.open_data())
+
+        FeatureClass.objects.filter(id=feature_class.id).update(open_data=False)
+        self.assertNotIn(self.feature_public, Feature.objects.open_data())
+
 
 class TestFeatureRelatedQuerySet(TestCase):
     def setUp(self):
@@ -411,6 +470,21 @@ class TestFeatureRelatedProtectionLevelQuerySet(TestCase):
         ]
         self.assertQuerySetEqual(qs, expected_queryset, ordered=False)
 
+    def test_visibility_counts(self):
+        with self.assertNumQueries(1):
+            counts = Observation.objects.visibility_counts()
+        self.assertEqual(
+            counts,
+            {
+                "ADMIN": 6,
+                "OFFICE_HKI": 6,
+                "OFFICE": 5,
+                "PUBLIC": 3,
+                "OPEN_DATA": 1,
+                "WWW": 1,
+            },
+        )
+
 
 class TestOrigin(TestCase):
     def setUp(self):
@@ -507,6 +581,31 @@ class TestFeature(TestCase):
         self.feature.save()
         self.assertAlmostEqual(self.feature.area, 4 / 10000)
 
+    def test_save_wgs84_geometry(self):
+        self.feature.geometry = Point(25496000, 6673000)
+        self.feature.save()
+        self.feature.refresh_from_db()
+        self.assertEqual(self.feature.geometry_wgs84.srid, 4326)
+        self.assertAlmostEqual(self.feature.geometry_wgs84.x, 24.928, places=3)
+        self.assertAlmostEqual(self.feature.geometry_wgs84.y, 60.170, places=3)
+
+    def test_update_wgs84_geometry(self):
+        Feature.objects.filter(id=self.feature.id).update(
+            geometry=Point(25496000, 6673000, srid=3879)
+        )
+        self.feature.refresh_from_db()
+        self.assertAlmostEqual(self.feature.geometry_wgs84.x, 24.928, places=3)
+        self.assertAlmostEqual(self.feature.geometry_wgs84.y, 60.170, places=3)
+
+    def test_save_visibility(self):
+        self.feature.protection_level = PROTECTION_LEVELS["OFFICE"]
+        self.feature.save(update_fields=["protection_level"])
+        self.feature.refresh_from_db()
+        self.assertEqual(
+            self.feature.visibility,
+            VISIBILITY["ADMIN"] | VISIBILITY["OFFICE_HKI"] | VISIBILITY["OFFICE"],
+        )
+
     def test_formatted_area(self):
         # No area
         self.assertIsNone(self.feature.area)
@@ -566,6 +665,20 @@ class TestHistoricalFeature(TestCase):
     def setUp(self):
         self.historical_feature = HistoricalFeatureFactory(name="historical feature")
 
+    def test_role_querysets(self):
+        admin_only = HistoricalFeatureFactory(
+            protection_level=PROTECTION_LEVELS["ADMIN"]
+        )
+        non_open_data = HistoricalFeatureFactory(
+            feature_class=FeatureClassFactory(open_data=False)
+        )
+        qs = HistoricalFeature.objects.all()
+        self.assertEqual(qs.for_admin().count(), 3)
+        self.assertNotIn(admin_only, qs.for_office())
+        self.assertNotIn(admin_only, qs.for_public())
+        self.assertIn(non_open_data, qs.for_public())
+        self.assertEqual(list(qs.open_data()), [self.historical_feature])
+
     def test__str__(self):
         self.assertEqual(self.historical_feature.__str__(), "historical feature")
 
@@ -604,6 +717,66 @@ class TestObservation(TestCase):
         self.observation.code = None
         self.assertEqual(self.observation.__str__(), "Observation 321")
 
+    def test_observation_counts(self):
+        feature = self.observation.feature
+        species = self.observation.species
+        all_counted = {name: 1 for name in VISIBILITY}
+        self.assertEqual(feature.get_observation_counts(), all_counted)
+        self.assertEqual(species.get_observation_counts(), all_counted)
+
+        self.observation.protection_level = PROTECTION_LEVELS["ADMIN"]
+        self.observation.save()
+        admin_counted = {name: 0 for name in VISIBILITY}
+        admin_counted["ADMIN"] = 1
+        self.assertEqual(feature.get_observation_counts(), admin_counted)
+
+        other_feature = FeatureFactory()
+        self.observation.feature = other_feature
+        self.observation.save()
+        self.assertEqual(feature.get_observation_counts()["ADMIN"], 0)
+        self.assertEqual(other_feature.get_observation_counts(), admin_counted)
+
+        self.observation.delete()
+        self.assertEqual(other_feature.get_observation_counts()["ADMIN"], 0)
+        self.assertEqual(species.get_observation_counts()["ADMIN"], 0)
+
+    def test_observation_counts_feature_change(self):
+        feature = self.observation.feature
+        feature.protection_level = PROTECTION_LEVELS["OFFICE"]
+        feature.save()
+        counts = feature.get_observation_counts()
+        self.assertEqual(counts["OFFICE"], 1)
+        self.assertEqual(counts["PUBLIC"], 0)
+        self.assertEqual(self.observation.species.get_observation_counts(), counts)
+
+    def test_observation_counts_unchanged_visibility(self):
+        feature = Feature.objects.get(pk=self.observation.feature_id)
+        feature.name = "New name"
+        with patch.object(FeatureObservationCount, "update_counts") as update_counts:
+            feature.save()
+        update_counts.assert_not_called()
+
+    def test_observation_counts_feature_class_change(self):
+        feature_class = self.observation.feature.feature_class
+        feature_class.open_data = False
+        feature_class.save()
+        self.assertEqual(
+            self.observation.feature.get_observation_counts()["OPEN_DATA"], 0
+        )
+        self.assertEqual(
+            self.observation.species.get_observation_counts()["OPEN_DATA"], 0
+        )
+
+        FeatureClass.objects.filter(pk=feature_class.pk).update(www=False)
+        self.assertEqual(self.observation.feature.get_observation_counts()["WWW"], 0)
+
+    def test_observation_counts_not_stored(self):
+        feature = self.observation.feature
+        FeatureObservationCount.objects.all().delete()
+        with self.assertNumQueries(2):
+            counts = feature.get_observation_counts()
+        self.assertEqual(counts, {name: 1 for name in VISIBILITY})
+
 
 class TestSpecies(TestCase):
     def setUp(self):
@@ -619,6 +792,33 @@ class TestSpecies(TestCase):
         self.species.name_fi = None
         self.assertEqual(self.species.__str__(), "name_sci, name_subspecies")
 
+    def test_visibility(self):
+        all_visible = sum(VISIBILITY.values())
+        self.assertEqual(self.species.visibility, all_visible)
+
+        Species.objects.update(protection_level=PROTECTION_LEVELS["ADMIN"])
+        self.species.refresh_from_db()
+        self.assertEqual(self.species.visibility, VISIBILITY["ADMIN"])
+
+        self.species.protection_level = PROTECTION_LEVELS["PUBLIC"]
+        self.species.save()
+        self.species.refresh_from_db()
+        self.assertEqual(self.species.visibility, all_visible)
+
+    def test_bulk_update_visibility(self):
+        other_species = SpeciesFactory()
+        self.species.protection_level = PROTECTION_LEVELS["ADMIN"]
+        other_species.protection_level = PROTECTION_LEVELS["OFFICE"]
+        Species.objects.bulk_update([self.species, other_species], ["protection_level"])
+
+        self.species.refresh_from_db()
+        self.assertEqual(self.species.visibility, VISIBILITY["ADMIN"])
+        other_species.refresh_from_db()
+        self.assertEqual(
+            other_species.visibility,
+            VISIBILITY["ADMIN"] | VISIBILITY["OFFICE_HKI"] | VISIBILITY["OFFICE"],
+        )
+
 
 class TestMigrationClass(TestCase):
     def setUp(self):
@@ -851,3 +1051,53 @@ class TestFrequency(TestCase):
         self.frequency.source = None
         self.frequency.explanation = None
         self.assertTrue(self.frequency.is_empty)
+
+
+class TestFeatureClassRegistry(TestCase):
+    def setUp(self):
+        self.feature_class = FeatureClassFactory(open_data=False)
+
+    def test_reload_on_change(self):
+        feature = FeatureFactory(feature_class=self.feature_class)
+        feature = Feature.objects.get(pk=feature.pk)
+        self.assertFalse(feature_class_registry.get(self.feature_class.id).open_data)
+        self.assertFalse(feature.is_protected)
+
+        self.feature_class.open_data = True
+        self.feature_class.super_class = FeatureClassFactory(
+            id=FeatureClass.PROTECTED_SUPER_CLASS_ID
+        )
+        self.feature_class.save()
+        self.assertTrue(feature_class_registry.get(self.feature_class.id).open_data)
+        self.assertTrue(feature.is_protected)
+
+        feature.delete()
+
+        self.feature_class.delete()
+        self.assertIsNone(feature_class_registry.get(self.feature_class.id))
+
+    def test_stored_visibility_does_not_use_stale_registry(self):
+        feature = FeatureFactory(feature_class=self.feature_class)
+        feature_class_registry.get(self.feature_class.id)
+        # Changed in another process that does not share the cache
+        QuerySet.update(
+            FeatureClass.objects.filter(pk=self.feature_class.pk), open_data=True
+        )
+        self.assertFalse(feature_class_registry.get(self.feature_class.id).open_data)
+
+        feature = Feature.objects.get(pk=feature.pk)
+        feature.save()
+        self.assertTrue(feature.visibility & VISIBILITY["OPEN_DATA"])
+
+    def test_feature_is_protected(self):
+        self.feature_class.super_class = FeatureClassFactory(
+            id=FeatureClass.PROTECTED_SUPER_CLASS_ID
+        )
+        self.feature_class.save()
+        feature = FeatureFactory(feature_class=self.feature_class)
+        feature = Feature.objects.get(pk=feature.pk)
+        feature_class_registry.get(self.feature_class.id)
+
+        with self.assertNumQueries(0):
+            self.assertTrue(feature.is_protected)
+            self.assertFalse(feature.is_square)
@@ -0,0 +1,145 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from nature.management.commands.publish_reports import get_report_file
+from nature.models import PROTECTION_LEVELS
+from nature.tests.factories import (
+    FeatureFactory,
+    ObservationFactory,
+    SpeciesRegulationFactory,
+    TransactionFeatureFactory,
+)
+
+
+class TestPublishReports(TestCase):
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir)
+        self.feature = FeatureFactory(name="Feature name")
+        self.observation = ObservationFactory(feature=self.feature)
+
+    def publish(self, *args):
+        out = StringIO()
+        call_command(
+            "publish_reports",
+            *args,
+            output_dir=self.output_dir,
+            host="testserver",
+            processes=1,
+            stdout=out,
+        )
+        return {
+            line.rsplit(" ", 1)[-1]: int(line.split(" ")[1])
+            for line in out.getvalue().splitlines()
+        }
+
+    def get_report_file(self, url_name, pk):
+        return get_report_file(self.output_dir, url_name, pk)
+
+    def test_full_run(self):
+        counts = self.publish()
+        self.assertEqual(
+            counts,
+            {"feature-report": 1, "species-report": 1, "observationseries-report": 1},
+        )
+        with open(self.get_report_file("feature-report", self.feature.pk)) as f:
+            self.assertIn("Feature name", f.read())
+        self.assertTrue(
+            os.path.exists(
+                self.get_report_file("species-report", self.observation.species_id)
+            )
+        )
+
+        self.assertEqual(self.publish("--full")["feature-report"], 1)
+
+    @override_settings(REPORT_PDF_COMMAND="cat")
+    def test_reports_do_not_link_to_pdf(self):
+        self.publish()
+        with open(self.get_report_file("feature-report", self.feature.pk)) as f:
+            self.assertNotIn("format=pdf", f.read())
+
+    def test_incremental_run(self):
+        other_feature = FeatureFactory()
+        self.publish()
+        self.assertEqual(set(self.publish().values()), {0})
+
+        self.observation.code = "changed"
+        self.observation.save()
+        counts = self.publish()
+        self.assertEqual(
+            counts,
+            {"feature-report": 1, "species-report": 1, "observationseries-report": 1},
+        )
+
+        other_feature.name = "Changed name"
+        other_feature.save()
+        counts = self.publish()
+        self.assertEqual(counts["feature-report"], 1)
+        # The feature is not shown in other reports
+        self.assertEqual(counts["species-report"], 0)
+        with open(self.get_report_file("feature-report", other_feature.pk)) as f:
+            self.assertIn("Changed name", f.read())
+
+        self.observation.species.name_fi = "changed"
+        self.observation.species.save()
+        counts = self.publish()
+        # The species is shown in the observations of the feature
+        self.assertEqual(counts["feature-report"], 1)
+        self.assertEqual(counts["species-report"], 1)
+
+    def test_changed_transaction(self):
+        other_feature = FeatureFactory()
+        transaction = TransactionFeatureFactory(feature=self.feature).transaction
+        self.publish()
+
+        transaction.description = "Changed description"
+        transaction.save()
+        counts = self.publish()
+        self.assertEqual(counts["feature-report"], 1)
+        with open(self.get_report_file("feature-report", self.feature.pk)) as f:
+            self.assertIn("Changed description", f.read())
+
+        transaction.features.add(other_feature)
+        counts = self.publish()
+        self.assertEqual(counts["feature-report"], 1)
+        with open(self.get_report_file("feature-report", other_feature.pk)) as f:
+            self.assertIn("Changed description", f.read())
+
+    def test_changed_species_regulation(self):
+        self.publish()
+        SpeciesRegulationFactory(species=self.observation.species)
+        counts = self.publish()
+        # The regulations are shown in the observations of the feature
+        self.assertEqual(counts["feature-report"], 1)
+        self.assertEqual(counts["species-report"], 1)
+
+    def test_changed_code_list(self):
+        transaction_type = TransactionFeatureFactory().transaction.transaction_type
+        self.publish()
+
+        transaction_type.name = "Changed name"
+        transaction_type.save()
+        counts = self.publish()
+        self.assertEqual(counts["feature-report"], 2)
+        self.assertEqual(counts["species-report"], 1)
+
+    def test_deleted_observation(self):
+        self.publish()
+        self.observation.delete()
+        counts = self.publish()
+        self.assertEqual(counts["feature-report"], 1)
+
+    def test_unpublished_reports_are_removed(self):
+        self.publish()
+        report_file = self.get_report_file("feature-report", self.feature.pk)
+        self.assertTrue(os.path.exists(report_file))
+
+        self.feature.protection_level = PROTECTION_LEVELS["ADMIN"]
+        self.feature.save()
+        self.publish()
+        self.assertFalse(os.path.exists(report_file))
@@ -0,0 +1,139 @@
+from unittest.mock import patch, PropertyMock
+
+from django.contrib.gis.geos import Polygon
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from nature.caching import bump_version, get_version
+from nature.enums import UserRole
+from nature.models import PROTECTION_LEVELS
+from nature.tiles import MVT_CONTENT_TYPE, get_tile_bounds
+
+from .factories import FeatureClassFactory, FeatureFactory
+from .utils import make_user
+
+# Zoom level 5 tile in the Helsinki region
+TILE = {"z": 5, "x": 16, "y": 26}
+
+
+class TestTileBounds(TestCase):
+    def test_get_tile_bounds(self):
+        self.assertEqual(
+            get_tile_bounds(0, 0, 0), (24451424, 6291456, 26548576, 8388608)
+        )
+        self.assertEqual(
+            get_tile_bounds(1, 1, 1), (25500000, 6291456, 26548576, 7340032)
+        )
+
+
+class TestCaching(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_bump_version(self):
+        version = get_version("test")
+        self.assertEqual(get_version("test"), version)
+        bump_version("test")
+        self.assertGreater(get_version("test"), version)
+
+    def test_bump_version_unused(self):
+        bump_version("unused")
+        self.assertIsNotNone(get_version("unused"))
+
+
+class TestFeatureTileView(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.url = reverse("feature-tile", kwargs=TILE)
+        bounds = get_tile_bounds(**TILE)
+        self.geometry = Polygon.from_bbox(
+            (bounds[0] + 1000, bounds[1] + 1000, bounds[0] + 2000, bounds[1] + 2000)
+        )
+
+    def test_empty_tile(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], MVT_CONTENT_TYPE)
+        self.assertEqual(response.content, b"")
+
+    def test_tile_out_of_range(self):
+        url = reverse("feature-tile", kwargs={"z": 1, "x": 2, "y": 0})
+        self.assertEqual(self.client.get(url).status_code, 404)
+        url = reverse("feature-tile", kwargs={"z": 16, "x": 0, "y": 0})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_open_data(self):
+        FeatureFactory(
+            geometry=self.geometry, protection_level=PROTECTION_LEVELS["ADMIN"]
+        )
+        FeatureFactory(
+            geometry=self.geometry,
+            feature_class=FeatureClassFactory(open_data=False),
+        )
+        self.assertEqual(self.client.get(self.url).content, b"")
+
+        FeatureFactory(geometry=self.geometry)
+        self.assertNotEqual(self.client.get(self.url).content, b"")
+
+    def test_staff_user(self):
+        FeatureFactory(
+            geometry=self.geometry, protection_level=PROTECTION_LEVELS["ADMIN"]
+        )
+        self.client.force_login(make_user())
+        self.assertNotEqual(self.client.get(self.url).content, b"")
+
+    @patch(
+        "nature.hmac.HMACAuth.user_role",
+        new_callable=PropertyMock(return_value=UserRole.OFFICE),
+    )
+    def test_hmac_role(self, *args):
+        FeatureFactory(
+            geometry=self.geometry, protection_level=PROTECTION_LEVELS["OFFICE"]
+        )
+        response = self.client.get(self.url, HTTP_AUTHORIZATION="hmac test")
+        self.assertNotEqual(response.content, b"")
+        self.assertIn("X-Forwarded-Groups", response["Vary"])
+
+    def test_invalid_hmac_header(self):
+        FeatureFactory(
+            geometry=self.geometry, protection_level=PROTECTION_LEVELS["OFFICE"]
+        )
+        response = self.client.get(self.url, HTTP_AUTHORIZATION="hmac test")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"")
+
+        FeatureFactory(geometry=self.geometry)
+        response = self.client.get(self.url, HTTP_AUTHORIZATION="hmac test")
+        self.assertNotEqual(response.content, b"")
+
+    def test_feature_class_filter(self):
+        feature = FeatureFactory(geometry=self.geometry)
+        response = self.client.get(self.url, {"feature_class": "other"})
+        self.assertEqual(response.content, b"")
+
+        response = self.client.get(
+            self.url, {"feature_class": "other," + feature.feature_class_id}
+        )
+        self.assertNotEqual(response.content, b"")
+
+        # Values that are not valid cache key characters are hashed
+        response = self.client.get(self.url, {"feature_class": "a b," + "x" * 300})
+        self.assertEqual(response.status_code, 200)
+
+    def test_cache_is_invalidated_when_features_change(self):
+        self.assertEqual(self.client.get(self.url).content, b"")
+
+        feature = FeatureFactory(geometry=self.geometry)
+        self.assertNotEqual(self.client.get(self.url).content, b"")
+
+        feature.delete()
+        self.assertEqual(self.client.get(self.url).content, b"")
+
+    def test_cache_is_invalidated_when_feature_classes_change(self):
+        feature = FeatureFactory(geometry=self.geometry)
+        self.assertNotEqual(self.client.get(self.url).content, b"")
+
+        feature.feature_class.open_data = False
+        feature.feature_class.save()
+        self.assertEqual(self.client.get(self.url).content, b"")
@@ -1,8 +1,10 @@
 from unittest.mock import MagicMock, patch, PropertyMock
 
 from django.contrib.auth.models import AnonymousUser
+from django.db import connection
 from django.http import QueryDict
 from django.test import Client, TestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils.translation import activate
 from freezegun import freeze_time
@@ -11,17 +13,38 @@ from hmac_auth.models import HMACGroup
 from hmac_auth.tests.factories import HMACGroupFactory
 from nature.models import PROTECTION_LEVELS, OFFICE_HKI_ONLY_FEATURE_CLASS_ID
 from nature.tests.factories import (
+    AbundanceFactory,
+    BreedingDegreeFactory,
     FeatureClassFactory,
+    FeatureValueFactory,
+    FrequencyFactory,
+    MigrationClassFactory,
     ObservationFactory,
     FeatureFactory,
     ObservationSeriesFactory,
     HabitatTypeObservationFactory,
+    OccurrenceFactory,
+    OriginFactory,
+    PublicationFactory,
+    RegulationFactory,
     SpeciesRegulationFactory,
     SpeciesFactory,
+    TransactionFeatureFactory,
+)
+from nature.report_pdf import (
+    RENDER_FAILED,
+    RENDER_FAILED_TIMEOUT,
+    PDFRenderQueue,
+    pdf_render_queue,
 )
 from nature.tests.utils import make_user
 from ..enums import UserRole
-from ..views import FeatureWFSView, SpeciesReportView, FeatureObservationsReportView
+from ..views import (
+    FeatureWFSView,
+    SpeciesObservationPagesView,
+    SpeciesReportView,
+    FeatureObservationsReportView,
+)
 
 
 @override_settings(SHARED_SECRET="test-secret-key", ALLOWED_HOSTS=["localhost"])
@@ -371,8 +394,9 @@ class TestSpeciesReportView(TestCase):
         view.object = self.species
 
         context = view.get_context_data()
+        self.assertNotIn("observations", context)
         self.assertQuerySetEqual(
-            context["observations"],
+            view.get_filtered_observations(),
             [
                 (self.observation_admin),
                 (self.observation_office_hki),
@@ -396,8 +420,9 @@ class TestSpeciesReportView(TestCase):
         view.object = self.species
 
         context = view.get_context_data()
+        self.assertNotIn("observations", context)
         self.assertQuerySetEqual(
-            context["observations"],
+            view.get_filtered_observations(),
             [
                 (self.observation_office_hki),
                 (self.observation_office),
@@ -420,8 +445,9 @@ class TestSpeciesReportView(TestCase):
         view.object = self.species
 
         context = view.get_context_data()
+        self.assertNotIn("observations", context)
         self.assertQuerySetEqual(
-            context["observations"],
+            view.get_filtered_observations(),
             [(self.observation_office), (self.observation_www)],
             ordered=False,
         )
@@ -440,8 +466,9 @@ class TestSpeciesReportView(TestCase):
         view.object = self.species
 
         context = view.get_context_data()
+        self.assertNotIn("observations", context)
         self.assertQuerySetEqual(
-            context["observations"],
+            view.get_filtered_observations(),
             [(self.observation_www)],
         )
         self.assertEqual(context["secret_observation_count"], 0)
@@ -483,8 +510,9 @@ class TestFeatureObservationsReportView(TestCase):
         view.object = self.feature
 
         context = view.get_context_data()
+        self.assertNotIn("observations", context)
         self.assertQuerySetEqual(
-            context["observations"],
+            view.get_filtered_observations(),
             [
                 (self.observation_admin),
                 (self.observation_office),
@@ -509,8 +537,9 @@ class TestFeatureObservationsReportView(TestCase):
         view.object = self.feature
 
         context = view.get_context_data()
+        self.assertNotIn("observations", context)
         self.assertQuerySetEqual(
-            context["observations"],
+            view.get_filtered_observations(),
             [(self.observation_office), (self.observation_www)],
             ordered=False,
         )
@@ -531,8 +560,9 @@ class TestFeatureObservationsReportView(TestCase):
         view.object = self.feature
 
         context = view.get_context_data()
+        self.assertNotIn("observations", context)
         self.assertQuerySetEqual(
-            context["observations"],
+            view.get_filtered_observations(),
             [(self.observation_office), (self.observation_www)],
             ordered=False,
         )
@@ -553,8 +583,9 @@ class TestFeatureObservationsReportView(TestCase):
         view.object = self.feature
 
         context = view.get_context_data()
+        self.assertNotIn("observations", context)
         self.assertQuerySetEqual(
-            context["observations"],
+            view.get_filtered_observations(),
             [self.observation_www],
             ordered=False,
         )
@@ -625,3 +656,252 @@ class TestReportViews(TestCase):
         url = reverse("nature:observation-report", kwargs={"pk": observation.id})
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
+
+
+@patch(
+    "nature.views.HMACAuth.user_role",
+    new_callable=PropertyMock(return_value=UserRole.ADMIN),
+)
+class TestReportQueryCounts(TestCase):
+    """
+    TestCase that verifies that the number of queries of the reports
+    does not depend on the number of objects shown in them
+    """
+
+    def setUp(self):
+        self.client = Client()
+        self.feature = FeatureFactory()
+        self.species = SpeciesFactory()
+
+    def add_report_objects(self):
+        observation = ObservationFactory(
+            feature=self.feature,
+            species=SpeciesFactory(),
+            abundance=AbundanceFactory(),
+            frequency=FrequencyFactory(),
+            migration_class=MigrationClassFactory(),
+            origin=OriginFactory(),
+            breeding_degree=BreedingDegreeFactory(),
+            occurrence=OccurrenceFactory(),
+        )
+        SpeciesRegulationFactory(species=observation.species)
+        ObservationFactory(species=self.species)
+        FeatureValueFactory(feature=self.feature)
+        self.feature.publications.add(PublicationFactory())
+        HabitatTypeObservationFactory(feature=self.feature)
+        transaction = TransactionFeatureFactory(feature=self.feature).transaction
+        transaction.regulations.add(RegulationFactory())
+
+    def assertConstantQueries(self, url):
+        self.add_report_objects()
+        with CaptureQueriesContext(connection) as first_queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        self.add_report_objects()
+        self.add_report_objects()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), len(first_queries))
+
+    def test_feature_report(self, *args):
+        url = reverse("nature:feature-report", kwargs={"pk": self.feature.id})
+        self.assertConstantQueries(url)
+
+    def test_species_report(self, *args):
+        url = reverse("nature:species-report", kwargs={"pk": self.species.id})
+        self.assertConstantQueries(url)
+
+    def test_feature_observations_report(self, *args):
+        url = reverse(
+            "nature:feature-observations-report", kwargs={"pk": self.feature.id}
+        )
+        self.assertConstantQueries(url)
+
+    def test_species_observation_pages(self, *args):
+        url = reverse(
+            "nature:species-observation-pages", kwargs={"pk": self.species.id}
+        )
+        self.assertConstantQueries(url)
+
+    def test_feature_observation_pages(self, *args):
+        url = reverse(
+            "nature:feature-observation-pages", kwargs={"pk": self.feature.id}
+        )
+        self.assertConstantQueries(url)
+
+
+@patch("nature.views.HMACAuth.user_role", new_callable=PropertyMock)
+class TestReportCache(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.feature = FeatureFactory(name="Old name")
+        self.url = reverse("nature:feature-report", kwargs={"pk": self.feature.id})
+
+    def test_report_is_cached(self, user_role):
+        user_role.return_value = UserRole.PUBLIC
+        response = self.client.get(self.url)
+        self.assertContains(response, "Old name")
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertContains(response, "Old name")
+
+    def test_report_is_invalidated_on_save(self, user_role):
+        user_role.return_value = UserRole.PUBLIC
+        self.client.get(self.url)
+
+        self.feature.name = "New name"
+        self.feature.save()
+        response = self.client.get(self.url)
+        self.assertContains(response, "New name")
+
+    def test_report_is_cached_per_role(self, user_role):
+        user_role.return_value = UserRole.PUBLIC
+        response = self.client.get(self.url)
+        self.assertContains(response, "<title>Feature Report - Public</title>")
+
+        user_role.return_value = UserRole.ADMIN
+        response = self.client.get(self.url)
+        self.assertContains(response, "<title>Feature Report - Admin</title>")
+
+    def test_observation_report_is_invalidated_on_feature_protection(self, user_role):
+        user_role.return_value = UserRole.PUBLIC
+        observation = ObservationFactory(feature=self.feature)
+        url = reverse("nature:observation-report", kwargs={"pk": observation.id})
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        self.feature.protection_level = PROTECTION_LEVELS["ADMIN"]
+        self.feature.save()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+@patch(
+    "nature.views.HMACAuth.user_role",
+    new_callable=PropertyMock(return_value=UserRole.PUBLIC),
+)
+class TestObservationPagesView(TestCase):
+    def setUp(self):
+        self.species = SpeciesFactory()
+        feature_class = FeatureClassFactory(name="Meadows", www=True)
+        self.observations = [
+            ObservationFactory(
+                species=self.species,
+                feature=FeatureFactory(feature_class=feature_class, name=name),
+            )
+            for name in ["Feature 1", "Feature 2"]
+        ]
+        ObservationFactory(
+            species=self.species,
+            feature=FeatureFactory(feature_class=feature_class, name="Secret"),
+            protection_level=PROTECTION_LEVELS["OFFICE"],
+        )
+        self.url = reverse(
+            "nature:species-observation-pages", kwargs={"pk": self.species.id}
+        )
+
+    def test_species_report_loads_observation_pages(self, *args):
+        url = reverse("nature:species-report", kwargs={"pk": self.species.id})
+        response = self.client.get(url)
+        self.assertContains(response, 'data-url="{0}"'.format(self.url))
+        self.assertNotContains(response, "Feature 1")
+
+    def test_observation_pages_are_filtered_by_role(self, *args):
+        data = self.client.get(self.url).json()
+        self.assertEqual(data["count"], 2)
+        self.assertIsNone(data["next"])
+        self.assertIn("Feature 1", data["html"])
+        self.assertIn("Feature 2", data["html"])
+        self.assertNotIn("Secret", data["html"])
+
+    @patch.object(SpeciesObservationPagesView, "paginate_by", 1)
+    def test_observation_pages(self, *args):
+        data = self.client.get(self.url).json()
+        self.assertEqual(data["next"], self.url + "?page=2")
+        self.assertIn("Feature 1", data["html"])
+        self.assertEqual(data["html"].count("Meadows"), 1)
+
+        data = self.client.get(data["next"]).json()
+        self.assertIsNone(data["next"])
+        self.assertIn("Feature 2", data["html"])
+        # The feature class continues from the previous page
+        self.assertNotIn("Meadows", data["html"])
+
+
+@override_settings(REPORT_PDF_COMMAND="cat")
+@patch(
+    "nature.views.HMACAuth.user_role",
+    new_callable=PropertyMock(return_value=UserRole.PUBLIC),
+)
+class TestReportPDF(TestCase):
+    def setUp(self):
+        self.feature = FeatureFactory(name="Feature name")
+        self.url = (
+            reverse("nature:feature-report", kwargs={"pk": self.feature.id})
+            + "?format=pdf"
+        )
+
+    def test_pdf_is_rendered_in_background(self, *args):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 202)
+
+        pdf_render_queue.wait()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        # cat "converts" the report to PDF as it is
+        self.assertIn(b"Feature name", response.content)
+
+    def test_pdf_is_invalidated_on_save(self, *args):
+        self.client.get(self.url)
+        pdf_render_queue.wait()
+
+        self.feature.name = "New name"
+        self.feature.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 202)
+
+    @override_settings(REPORT_PDF_COMMAND="false")
+    def test_pdf_rendering_fails(self, *args):
+        self.client.get(self.url)
+        pdf_render_queue.wait()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 503)
+
+    def test_pdf_caching_fails(self, *args):
+        queue = PDFRenderQueue()
+        with patch("nature.report_pdf.cache") as cache:
+            # e.g. the PDF exceeds the item size limit of memcached
+            cache.set.side_effect = [Exception, None]
+            queue.submit("key", b"report")
+            queue.wait()
+        self.assertEqual(
+            cache.set.call_args.args, ("key", RENDER_FAILED, RENDER_FAILED_TIMEOUT)
+        )
+
+    @override_settings(REPORT_PDF_COMMAND="")
+    def test_pdf_disabled(self, *args):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 404)
+
+
+class TestHMACAuthFailureStatsView(TestCase):
+    def setUp(self):
+        self.url = reverse("nature:hmac-auth-failures")
+
+    def test_failures_are_counted(self):
+        feature = FeatureFactory()
+        url = reverse("nature:feature-report", kwargs={"pk": feature.id})
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(make_user(username="test_admin", is_admin=True))
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["reported"], 1)
+        self.assertEqual(response.json()["buffered"], 1)
+
+    def test_staff_only(self):
+        self.client.force_login(make_user(username="test_user", is_admin=False))
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
@@ -0,0 +1,151 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.gis.geos import Polygon
+from django.core.cache import cache
+from django.db import connection
+from django.http import Http404, HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.views import View
+
+from nature.caching import get_model_versions
+from nature.enums import UserRole
+from nature.models import Feature, FeatureClass
+
+# ETRS-GK25 tile matrix set, the same that is used for the WMTS background maps
+TILE_MATRIX_ORIGIN = (24451424, 8388608)
+TILE_MATRIX_SIZE = 2097152  # width and height of the zoom level 0 tile in meters
+TILE_MATRIX_MAX_ZOOM = 15
+
+MVT_EXTENT = 4096
+MVT_BUFFER = 64
+MVT_LAYER_NAME = "features"
+MVT_CONTENT_TYPE = "application/vnd.mapbox-vector-tile"
+
+# Request headers the role of the tiles depends on
+ROLE_HEADERS = ("Cookie", "Authorization", "Proxy-Authorization", "X-Forwarded-Groups")
+
+
+def get_tile_bounds(z, x, y):
+    """Return the bounds of a tile in the ETRS-GK25 tile matrix set
+
+    :return: xmin, ymin, xmax, ymax in EPSG:3879
+    :rtype: tuple
+    """
+    size = TILE_MATRIX_SIZE / 2**z
+    xmin = TILE_MATRIX_ORIGIN[0] + x * size
+    ymax = TILE_MATRIX_ORIGIN[1] - y * size
+    return xmin, ymax - size, xmin + size, ymax
+
+
+class FeatureTileView(View):
+    """Mapbox vector tiles of features
+
+    Features can be filtered with a comma separated list of feature class
+    ids in ?feature_class=. Staff users see all features and HMAC requests
+    see the features allowed for their role, other requests see open data.
+
+    Tiles are cached until features or feature classes change.
+    """
+
+    def get(self, request, z, x, y):
+        if z > TILE_MATRIX_MAX_ZOOM or x >= 2**z or y >= 2**z:
+            raise Http404
+
+        role = self._get_role()
+        feature_classes = self._get_feature_classes()
+        key_data = [
+            get_model_versions([Feature, FeatureClass]),
+            role,
+            feature_classes,
+            z,
+            x,
+            y,
+        ]
+        cache_key = "nature:tile:" + hashlib.sha1(repr(key_data).encode()).hexdigest()
+        tile = cache.get(cache_key)
+        if tile is None:
+            tile = self._render_tile(role, feature_classes, z, x, y)
+            cache.set(cache_key, tile, settings.TILE_CACHE_TIMEOUT)
+
+        response = HttpResponse(tile, content_type=MVT_CONTENT_TYPE)
+        patch_vary_headers(response, ROLE_HEADERS)
+        return response
+
+    def _get_role(self):
+        if self.request.user.is_staff:
+            return UserRole.ADMIN.name
+
+        # Resolved by nature.middleware.HMACAuthMiddleware for valid hmac requests
+        user_role = getattr(self.request, "user_role", None)
+        if user_role is not None:
+            return user_role.name
+
+        return "OPEN_DATA"
+
+    def _get_feature_classes(self):
+        value = self.request.GET.get("feature_class", "")
+        return sorted({fc.strip() for fc in value.split(",") if fc.strip()})
+
+    def _get_queryset(self, role):
+        qs = Feature.objects.all()
+        if role == UserRole.ADMIN.name:
+            return qs.for_admin()
+        elif role == UserRole.OFFICE_HKI.name:
+            return qs.for_office_hki()
+        elif role == UserRole.OFFICE.name:
+            return qs.for_office()
+        elif role == UserRole.PUBLIC.name:
+            return qs.www()
+        return qs.open_data()
+
+    def _render_tile(self, role, feature_classes, z, x, y):
+        bounds = get_tile_bounds(z, x, y)
+        envelope = Polygon.from_bbox(bounds)
+        envelope.srid = settings.SRID
+
+        qs = self._get_queryset(role).filter(geometry__bboverlaps=envelope)
+        if feature_classes:
+            qs = qs.filter(feature_class__in=feature_classes)
+        ids_sql, ids_params = qs.values("id").query.sql_with_params()
+
+        opts = Feature._meta
+        sql = """
+            SELECT ST_AsMVT(tile, %s, %s, 'geom') FROM (
+                SELECT
+                    f.{pk} AS id,
+                    f.{name} AS name,
+                    f.{feature_class} AS feature_class,
+                    ST_AsMVTGeom(
+                        f.{geometry},
+                        ST_MakeEnvelope(%s, %s, %s, %s, %s),
+                        %s,
+                        %s,
+                        true
+                    ) AS geom
+                FROM {table} f
+                WHERE f.{pk} IN ({ids_sql})
+            ) AS tile
+        """.format(
+            pk=connection.ops.quote_name(opts.pk.column),
+            name=connection.ops.quote_name(opts.get_field("name").column),
+            feature_class=connection.ops.quote_name(
+                opts.get_field("feature_class").column
+            ),
+            geometry=connection.ops.quote_name(opts.get_field("geometry").column),
+            table=connection.ops.quote_name(opts.db_table),
+            ids_sql=ids_sql,
+        )
+        params = [
+            MVT_LAYER_NAME,
+            MVT_EXTENT,
+            *bounds,
+            settings.SRID,
+            MVT_EXTENT,
+            MVT_BUFFER,
+            *ids_params,
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            tile = cursor.fetchone()[0]
+        return bytes(tile) if tile else b""
@@ -20,6 +20,11 @@ urlpatterns = [
         views.FeatureObservationsReportView.as_view(),
         name="feature-observations-report",
     ),
+    re_path(
+        r"^feature-observations-report/(?P<pk>\d+)/observations/$",
+        views.FeatureObservationPagesView.as_view(),
+        name="feature-observation-pages",
+    ),
     re_path(
         r"^feature-habitattypeobservations-report/(?P<pk>\d+)/$",
         views.FeatureHabitatTypeObservationsReportView.as_view(),
@@ -30,6 +35,11 @@ urlpatterns = [
         views.SpeciesReportView.as_view(),
         name="species-report",
     ),
+    re_path(
+        r"^species-report/(?P<pk>\d+)/observations/$",
+        views.SpeciesObservationPagesView.as_view(),
+        name="species-observation-pages",
+    ),
     re_path(
         r"^species-regulations-report/(?P<pk>\d+)/$",
         views.SpeciesRegulationsReportView.as_view(),
@@ -41,4 +51,9 @@ urlpatterns = [
         name="observation-report",
     ),
     re_path(r"^wfs", views.FeatureWFSView.as_view(), name="wfs"),
+    re_path(
+        r"^hmac-auth-failures/$",
+        views.HMACAuthFailureStatsView.as_view(),
+        name="hmac-auth-failures",
+    ),
 ]
@@ -1,14 +1,80 @@
 import requests
 from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse
+from django.core.paginator import Paginator
+from django.db.models import Prefetch
+from django.http import HttpResponse, JsonResponse
+from django.template.loader import render_to_string
+from django.urls import reverse
 from django.utils.decorators import method_decorator
 from django.views import View
 from django.views.generic import DetailView
 
+from nature.auth_events import auth_failure_reporter
 from nature.hmac import HMACAuth
 from .enums import UserRole
-from .models import Feature, Species, ObservationSeries, Observation
+from .models import (
+    PROTECTION_LEVELS,
+    Abundance,
+    BreedingDegree,
+    Feature,
+    FeatureClass,
+    FeatureLink,
+    FeaturePublication,
+    FeatureValue,
+    Frequency,
+    HabitatType,
+    HabitatTypeObservation,
+    MigrationClass,
+    Occurrence,
+    Origin,
+    Species,
+    SpeciesRegulation,
+    ObservationSeries,
+    Observation,
+    Publication,
+    PublicationType,
+    Regulation,
+    Transaction,
+    TransactionFeature,
+    TransactionRegulation,
+    TransactionType,
+    Value,
+)
+from .report_cache import ReportCacheMixin
+from .report_pdf import ReportPDFMixin
+
+# Observation relations shown for each observation in the reports
+OBSERVATION_REPORT_RELATED_FIELDS = (
+    "series",
+    "abundance",
+    "frequency",
+    "migration_class",
+    "origin",
+    "breeding_degree",
+    "occurrence",
+)
+
+# Models of the objects shown in the observation lists of the reports
+OBSERVATION_REPORT_MODELS = (
+    Observation,
+    Species,
+    SpeciesRegulation,
+    Regulation,
+    ObservationSeries,
+    Abundance,
+    Frequency,
+    MigrationClass,
+    Origin,
+    BreedingDegree,
+    Occurrence,
+)
+
+
+def prefetch_valid_regulations(lookup):
+    """Return a Prefetch fetching only the valid regulations shown in the reports"""
+    return Prefetch(lookup, queryset=Regulation.objects.filter(valid=True))
 
 
 class ProtectedReportViewMixin:
@@ -19,37 +85,64 @@ class ProtectedReportViewMixin:
     reports are filtered based on forwarded authorization groups.
     """
 
+    # Role of the reports rendered without checking the request, e.g. when
+    # publishing the reports as static files
+    user_role = None
+
     def get_queryset(self):
         qs = super().get_queryset()
         if self.request.user.is_staff:
-            return qs
+            return self.with_visible_relations(qs, PROTECTION_LEVELS["ADMIN"])
 
-        hmac_auth = self._get_hmac_auth()
-        role = hmac_auth.user_role
+        role = self.get_user_role()
         if role == UserRole.ADMIN:
-            return qs.for_admin()
+            return self.with_visible_relations(
+                qs.for_admin(), PROTECTION_LEVELS["ADMIN"]
+            )
         elif role == UserRole.OFFICE_HKI:
-            return qs.for_office_hki()
+            return self.with_visible_relations(
+                qs.for_office_hki(), PROTECTION_LEVELS["OFFICE"]
+            )
         elif role == UserRole.OFFICE:
-            return qs.for_office()
+            return self.with_visible_relations(
+                qs.for_office(), PROTECTION_LEVELS["OFFICE"]
+            )
+
+        return self.with_visible_relations(qs.www(), PROTECTION_LEVELS["PUBLIC"])
 
-        return qs.www()
+    def with_visible_relations(self, qs, protection_level):
+        """Return the queryset fetching the related objects shown in the report
+
+        Reports only show the related objects visible at the given
+        protection level, which is ADMIN for staff users.
+        """
+        return qs
 
     def get_context_data(self, **kwargs):
         context_data = super().get_context_data(**kwargs)
         admin_hmac_roles = [UserRole.ADMIN, UserRole.OFFICE_HKI, UserRole.OFFICE]
-        hmac_auth = self._get_hmac_auth()
-        user_role = (
-            UserRole.ADMIN if self.request.user.is_staff else hmac_auth.user_role
-        )
+        user_role = self.get_user_role()
         user_is_in_admin_groups = (
-            self.request.user.is_staff or hmac_auth.user_role in admin_hmac_roles
+            self.request.user.is_staff or user_role in admin_hmac_roles
         )
         context_data["user_role"] = user_role.value
         context_data["user_is_in_admin_groups"] = user_is_in_admin_groups
 
         return context_data
 
+    def get_user_role(self):
+        """Return the role of the user, which is ADMIN for staff users"""
+        if self.user_role is None:
+            if self.request.user.is_staff:
+                self.user_role = UserRole.ADMIN
+            else:
+                # Resolved by nature.middleware.HMACAuthMiddleware for valid
+                # hmac requests, HMACAuth raises PermissionDenied for others
+                self.user_role = getattr(self.request, "user_role", None)
+                if self.user_role is None:
+                    self.user_role = self._get_hmac_auth().user_role
+        return self.user_role
+
     def _get_hmac_auth(self):
         if not hasattr(self, "_hmac_auth"):
             self._hmac_auth = HMACAuth(self.request)
@@ -59,13 +152,22 @@ class ProtectedReportViewMixin:
 class ProtectedObservationListReportViewMixin(ProtectedReportViewMixin):
     """View mixin to filter observations based on user roles"""
 
+    # URL name of the JSON pages of the observations loaded by the report,
+    # None renders all observations in the report
+    observation_pages_url_name = None
+
     def get_observation_queryset(self):
         raise NotImplementedError
 
     def get_context_data(self, **kwargs):
         context_data = super().get_context_data(**kwargs)
         if self.object:
-            context_data["observations"] = self.get_filtered_observations()
+            if self.observation_pages_url_name:
+                context_data["observation_pages_url"] = reverse(
+                    self.observation_pages_url_name, kwargs={"pk": self.object.pk}
+                )
+            else:
+                context_data["observations"] = self.get_filtered_observations()
             context_data[
                 "secret_observation_count"
             ] = self.get_secret_observation_count()
@@ -77,8 +179,7 @@ class ProtectedObservationListReportViewMixin(ProtectedReportViewMixin):
         if self.request.user.is_staff:
             return qs
 
-        hmac_auth = self._get_hmac_auth()
-        role = hmac_auth.user_role
+        role = self.get_user_role()
         if role == UserRole.ADMIN:
             qs = qs.for_admin()
         elif role == UserRole.OFFICE_HKI:
@@ -94,19 +195,48 @@ class ProtectedObservationListReportViewMixin(ProtectedReportViewMixin):
         if self.request.user.is_staff:
             return 0
 
-        hmac_auth = self._get_hmac_auth()
-        user_role = hmac_auth.user_role
-
+        user_role = self.get_user_role()
         if user_role not in [UserRole.OFFICE_HKI, user_role.OFFICE]:
             return 0
 
-        qs = self.get_observation_queryset()
-        admin_qs = qs.for_admin()
-        office_qs = (
-            qs.for_office_hki() if user_role == UserRole.OFFICE_HKI else qs.for_office()
+        counts = self.get_observation_counts()
+        return counts["ADMIN"] - counts[user_role.name]
+
+    def get_observation_counts(self):
+        """Return the numbers of observations of the report object by roles"""
+        return self.object.get_observation_counts()
+
+
+class ObservationPagesViewMixin:
+    """View mixin serving the observations of a report as JSON pages
+
+    The observations visible to the user are rendered in pages with
+    observation_list_template_name. The response contains the rendered
+    page, the number of observations and the URL of the next page.
+    """
+
+    observation_list_template_name = None
+    paginate_by = 100
+
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        paginator = Paginator(self.get_filtered_observations(), self.paginate_by)
+        page = paginator.get_page(request.GET.get("page"))
+        html = render_to_string(
+            self.observation_list_template_name,
+            self.get_page_context_data(page),
+            request,
         )
+        next_url = None
+        if page.has_next():
+            next_url = "{0}?page={1}".format(request.path, page.next_page_number())
+        return JsonResponse({"count": paginator.count, "html": html, "next": next_url})
 
-        return admin_qs.difference(office_qs).count()
+    def get_page_context_data(self, page):
+        return {
+            "observations": page.object_list,
+            "is_first_page": not page.has_previous(),
+        }
 
 
 class ValidRegulationsViewMixin(ProtectedReportViewMixin):
@@ -125,44 +255,113 @@ class ValidRegulationsViewMixin(ProtectedReportViewMixin):
 
 
 class FeatureReportView(
-    ProtectedObservationListReportViewMixin, ProtectedReportViewMixin, DetailView
+    ReportPDFMixin,
+    ReportCacheMixin,
+    ProtectedObservationListReportViewMixin,
+    ProtectedReportViewMixin,
+    DetailView,
 ):
-    queryset = Feature.objects.all()
+    queryset = Feature.objects.select_related("feature_class").prefetch_related(
+        "values",
+        Prefetch(
+            "publications",
+            queryset=Publication.objects.select_related("publication_type"),
+        ),
+        Prefetch(
+            "habitat_type_observations",
+            queryset=HabitatTypeObservation.objects.select_related(
+                "habitat_type", "observation_series"
+            ),
+        ),
+    )
     template_name = "nature/reports/feature-report.html"
+    cache_models = (
+        Feature,
+        FeatureClass,
+        FeatureLink,
+        FeatureValue,
+        Value,
+        FeaturePublication,
+        Publication,
+        PublicationType,
+        Transaction,
+        TransactionFeature,
+        TransactionRegulation,
+        TransactionType,
+        HabitatTypeObservation,
+        HabitatType,
+        *OBSERVATION_REPORT_MODELS,
+    )
 
     def get_observation_queryset(self):
-        return self.object.observations.all()
+        return self.object.observations.select_related(
+            "species", *OBSERVATION_REPORT_RELATED_FIELDS
+        ).prefetch_related(prefetch_valid_regulations("species__regulations"))
+
+    def with_visible_relations(self, qs, protection_level):
+        # The links and transactions of the feature are filtered by the prefetch
+        return qs.with_visible_relations(protection_level).prefetch_related(
+            "transactions__transaction_type", "transactions__regulations"
+        )
 
     def get_context_data(self, **kwargs):
         context_data = super().get_context_data(**kwargs)
         if self.object:
-            context_data[
-                "transactions"
-            ] = self.object.transactions.all().prefetch_related("regulations")
+            context_data["transactions"] = self.object.transactions.all()
         return context_data
 
 
-class ObservationReportView(ProtectedReportViewMixin, DetailView):
+class ObservationReportView(
+    ReportPDFMixin, ReportCacheMixin, ProtectedReportViewMixin, DetailView
+):
     queryset = Observation.objects.all()
     template_name = "nature/reports/observation-report.html"
+    cache_models = (Feature, FeatureClass, *OBSERVATION_REPORT_MODELS)
 
 
 class SpeciesReportView(
-    ProtectedObservationListReportViewMixin, ValidRegulationsViewMixin, DetailView
+    ReportPDFMixin,
+    ReportCacheMixin,
+    ProtectedObservationListReportViewMixin,
+    ValidRegulationsViewMixin,
+    DetailView,
 ):
     queryset = Species.objects.all()
     template_name = "nature/reports/species-report.html"
+    cache_models = (Feature, FeatureClass, *OBSERVATION_REPORT_MODELS)
+    observation_pages_url_name = "nature:species-observation-pages"
 
     def get_observation_queryset(self):
-        return self.object.observations.all().order_by("feature__feature_class__name")
+        return self.object.observations.select_related(
+            "feature__feature_class", *OBSERVATION_REPORT_RELATED_FIELDS
+        ).order_by("feature__feature_class__name", "pk")
 
     def get_regulations_queryset(self):
         return self.object.regulations.all()
 
 
-class SpeciesRegulationsReportView(ValidRegulationsViewMixin, DetailView):
+class SpeciesObservationPagesView(ObservationPagesViewMixin, SpeciesReportView):
+    observation_list_template_name = (
+        "nature/reports/stubs/species-observation-list.html"
+    )
+
+    def get_page_context_data(self, page):
+        context_data = super().get_page_context_data(page)
+        if page.has_previous():
+            # Feature class headers are not repeated at the start of the page
+            previous = page.paginator.object_list[page.start_index() - 2]
+            context_data["previous_feature_class_id"] = (
+                previous.feature.feature_class_id
+            )
+        return context_data
+
+
+class SpeciesRegulationsReportView(
+    ReportPDFMixin, ReportCacheMixin, ValidRegulationsViewMixin, DetailView
+):
     model = Species
     template_name = "nature/reports/species-regulations-report.html"
+    cache_models = (Species, SpeciesRegulation, Regulation)
 
     def get_regulations_queryset(self):
         return self.object.regulations.all()
@@ -174,18 +373,44 @@ class ObservationSeriesReportView(DetailView):
 
 
 class FeatureObservationsReportView(
-    ProtectedObservationListReportViewMixin, DetailView
+    ReportPDFMixin,
+    ReportCacheMixin,
+    ProtectedObservationListReportViewMixin,
+    DetailView,
 ):
-    queryset = Feature.objects.all()
+    queryset = Feature.objects.select_related("feature_class")
     template_name = "nature/reports/feature-observations-report.html"
+    cache_models = (Feature, FeatureClass, *OBSERVATION_REPORT_MODELS)
+    observation_pages_url_name = "nature:feature-observation-pages"
 
     def get_observation_queryset(self):
-        return self.object.observations.all().order_by("species__name_fi")
+        return (
+            self.object.observations.select_related(
+                "species", *OBSERVATION_REPORT_RELATED_FIELDS
+            )
+            .prefetch_related(prefetch_valid_regulations("species__regulations"))
+            .order_by("species__name_fi", "pk")
+        )
+
 
+class FeatureObservationPagesView(
+    ObservationPagesViewMixin, FeatureObservationsReportView
+):
+    observation_list_template_name = "nature/reports/stubs/observation-list.html"
 
-class FeatureHabitatTypeObservationsReportView(ProtectedReportViewMixin, DetailView):
+
+class FeatureHabitatTypeObservationsReportView(
+    ReportPDFMixin, ReportCacheMixin, ProtectedReportViewMixin, DetailView
+):
     queryset = Feature.objects.all()
     template_name = "nature/reports/feature-habitattypeobservations-report.html"
+    cache_models = (
+        Feature,
+        FeatureClass,
+        HabitatTypeObservation,
+        HabitatType,
+        ObservationSeries,
+    )
 
 
 @method_decorator(login_required, name="dispatch")
@@ -208,3 +433,11 @@ class FeatureWFSView(View):
         return "{0}:{1}".format(
             settings.WFS_NAMESPACE, self.request.GET.get("typeName")
         )
+
+
+@method_decorator(staff_member_required, name="dispatch")
+class HMACAuthFailureStatsView(View):
+    """Counters of the hmac authorization failures reported by this process"""
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(auth_failure_reporter.stats())